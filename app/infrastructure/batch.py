@@ -0,0 +1,236 @@
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Numeric, Float, Table, select, delete, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.infrastructure.lookup import id_in
+
+# Сколько строк можно передать в одном пакете
+MAX_BATCH_ITEMS = 5_000
+
+
+def _array_type(column) -> str:
+    return f"{column.type.compile(dialect=postgresql.dialect())}[]"
+
+
+def _db_value(column, value):
+    # веса приходят float'ами; в numeric пишем десятичную запись, а не двоичное приближение,
+    # сразу округлённую до масштаба колонки — так же значение вернёт RETURNING
+    if isinstance(value, float) and isinstance(column.type, Numeric) and not isinstance(column.type, Float):
+        value = Decimal(str(value))
+        if column.type.scale is not None and value.is_finite():
+            value = value.quantize(Decimal(1).scaleb(-column.type.scale))
+    return value
+
+
+def _unnest(array_types: list[str]) -> str:
+    """Аргументы unnest: CAST(:v0 AS type[]), ... — по одному параметру-массиву на колонку."""
+    return ', '.join(f"CAST(:v{number} AS {array_type})" for number, array_type in enumerate(array_types))
+
+
+async def execute_or_conflict(db: AsyncSession, statement, params: Optional[dict] = None):
+    """Выполняет оператор; нарушение ограничения (уникальный ключ, внешний ключ) — откат и 409.
+
+    Пакет пишется одной транзакцией, поэтому откатывается весь.
+    """
+    try:
+        return await db.execute(statement, params or {})
+    except IntegrityError as e:
+        await db.rollback()
+        # текст ошибки драйвера без обёрток SQLAlchemy
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e.orig.__cause__ or e.orig))
+
+
+async def missing_references(db: AsyncSession, table: Table, items: list[dict]) -> dict[int, str]:
+    """Ошибки по номерам строк, ссылающихся на несуществующие марки, штабели и т.п.
+
+    Проверка одним запросом на внешний ключ — иначе одна такая строка
+    уронила бы весь пакетный INSERT / UPDATE.
+    """
+    errors = {}
+    for column in table.columns:
+        if not column.foreign_keys:
+            continue
+        target = next(iter(column.foreign_keys)).column
+        values = {item[column.name] for item in items if item.get(column.name) is not None}
+        if not values:
+            continue
+        found = set((await db.execute(select(target).where(id_in(target, list(values))))).scalars())
+        for index, item in enumerate(items):
+            value = item.get(column.name)
+            if value is not None and value not in found and index not in errors:
+                errors[index] = f"Не найдена запись {target.table.name} с id {value}"
+    return errors
+
+
+async def batch_insert(db: AsyncSession, table: Table, items: list[dict], key_columns: list[str]) -> list[dict]:
+    """Вставляет строки одним INSERT ... SELECT FROM unnest(...) ON CONFLICT DO NOTHING.
+
+    Результат по каждой строке: created (с id), duplicate — такая запись по
+    естественному ключу уже есть (или повторяется в пакете), failed — битая ссылка.
+    Пустой key_columns — у таблицы нет естественного ключа, вставляются все строки.
+    """
+    errors = await missing_references(db, table, items)
+    valid = [(index, item) for index, item in enumerate(items) if index not in errors]
+
+    if not key_columns:
+        return await _insert_all(db, table, items, valid, errors)
+
+    inserted = {}
+    if valid:
+        columns = [column for column in table.columns if column.name in items[0]]
+        names = ', '.join(column.name for column in columns)
+        params = {
+            f"v{number}": [_db_value(column, item[column.name]) for _, item in valid]
+            for number, column in enumerate(columns)
+        }
+        result = await execute_or_conflict(db, text(f"""
+            INSERT INTO {table.name} ({names})
+            SELECT * FROM unnest({_unnest([_array_type(column) for column in columns])}) AS v({names})
+            ON CONFLICT ({', '.join(key_columns)}) DO NOTHING
+            RETURNING id, {', '.join(key_columns)}
+        """), params)
+        inserted = {tuple(row[1:]): row[0] for row in result.all()}
+
+    results = []
+    for index, item in enumerate(items):
+        if index in errors:
+            results.append({'index': index, 'status': 'failed', 'error': errors[index]})
+            continue
+        # id получает первая строка с ключом, остальные с тем же ключом — повторы
+        record_id = inserted.pop(tuple(_db_value(table.c[key], item[key]) for key in key_columns), None)
+        if record_id is None:
+            results.append({'index': index, 'status': 'duplicate'})
+        else:
+            results.append({'index': index, 'status': 'created', 'id': record_id})
+    return results
+
+
+async def _insert_all(db: AsyncSession, table: Table, items: list[dict], valid: list[tuple[int, dict]], errors: dict[int, str]) -> list[dict]:
+    # id берём из последовательности заранее: порядок строк RETURNING не гарантирован,
+    # а сопоставить их с пакетом по значениям без ключа нельзя
+    ids = []
+    if valid:
+        ids = list((await db.execute(
+            text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+            {'table': table.name, 'count': len(valid)},
+        )).scalars())
+        columns = [column for column in table.columns if column.name in items[0]]
+        names = ', '.join(['id'] + [column.name for column in columns])
+        params = {'v0': ids}
+        for number, column in enumerate(columns, start=1):
+            params[f"v{number}"] = [_db_value(column, item[column.name]) for _, item in valid]
+        await execute_or_conflict(db, text(f"""
+            INSERT INTO {table.name} ({names})
+            SELECT * FROM unnest({_unnest(['integer[]'] + [_array_type(column) for column in columns])}) AS v({names})
+        """), params)
+
+    created = {index: record_id for (index, _), record_id in zip(valid, ids)}
+    return [
+        {'index': index, 'status': 'failed', 'error': errors[index]} if index in errors
+        else {'index': index, 'status': 'created', 'id': created[index]}
+        for index in range(len(items))
+    ]
+
+
+async def batch_update(db: AsyncSession, table: Table, patches: list[dict]) -> list[dict]:
+    """Применяет патчи одним UPDATE ... FROM unnest(...).
+
+    patches — словари только с переданными полями и id. Для каждой колонки
+    передаётся массив значений и массив флагов «поле задано», поэтому у разных
+    строк можно менять разные поля, а явный null очищает значение.
+    """
+    errors = await missing_references(db, table, patches)
+    seen = set()
+    for index, patch in enumerate(patches):
+        if patch['id'] in seen and index not in errors:
+            errors[index] = "id повторяется в пакете"
+        seen.add(patch['id'])
+    valid = [patch for index, patch in enumerate(patches) if index not in errors]
+
+    columns = [column for column in table.columns if column.name != 'id' and any(column.name in patch for patch in valid)]
+    if valid and not columns:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Нет полей для изменения")
+
+    updated = set()
+    if valid:
+        array_types = ['integer[]']
+        params = {'v0': [patch['id'] for patch in valid]}
+        aliases, assignments = ['id'], []
+        for column in columns:
+            params[f"v{len(array_types)}"] = [_db_value(column, patch.get(column.name)) for patch in valid]
+            array_types.append(_array_type(column))
+            params[f"v{len(array_types)}"] = [column.name in patch for patch in valid]
+            array_types.append('boolean[]')
+            aliases += [column.name, f"set_{column.name}"]
+            assignments.append(
+                f"{column.name} = CASE WHEN v.set_{column.name} THEN v.{column.name} ELSE {table.name}.{column.name} END"
+            )
+        result = await execute_or_conflict(db, text(f"""
+            UPDATE {table.name} SET {', '.join(assignments)}
+            FROM unnest({_unnest(array_types)}) AS v({', '.join(aliases)})
+            WHERE {table.name}.id = v.id
+            RETURNING {table.name}.id
+        """), params)
+        updated = set(result.scalars())
+
+    results = []
+    for index, patch in enumerate(patches):
+        if index in errors:
+            results.append({'index': index, 'id': patch['id'], 'status': 'failed', 'error': errors[index]})
+        elif patch['id'] in updated:
+            results.append({'index': index, 'id': patch['id'], 'status': 'updated'})
+        else:
+            results.append({'index': index, 'id': patch['id'], 'status': 'not_found'})
+    return results
+
+
+async def batch_delete(
+    db: AsyncSession,
+    table: Table,
+    date_column,
+    ids: Optional[list[int]] = None,
+    stack_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> list[dict]:
+    """Удаляет одним DELETE по списку id и/или фильтру (штабель, даты включительно).
+
+    Для переданных id результат по каждому (deleted / not_found), для фильтра — по удалённым строкам.
+    """
+    if ids is None and stack_id is None and date_from is None and date_to is None:
+        # без условий удалилась бы вся таблица
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Укажите ids или фильтр для удаления")
+
+    statement = delete(table).returning(table.c.id)
+    if ids is not None:
+        statement = statement.where(id_in(table.c.id, ids))
+    if stack_id is not None:
+        statement = statement.where(table.c.stack_id == stack_id)
+    if date_from is not None:
+        statement = statement.where(date_column >= date_from)
+    if date_to is not None:
+        statement = statement.where(date_column <= date_to)
+    deleted = set((await execute_or_conflict(db, statement)).scalars())
+
+    if ids is None:
+        return [{'id': record_id, 'status': 'deleted'} for record_id in sorted(deleted)]
+    return [
+        {'index': index, 'id': record_id, 'status': 'deleted' if record_id in deleted else 'not_found'}
+        for index, record_id in enumerate(ids)
+    ]
+
+
+def batch_report(results: list[dict], status_code: int = status.HTTP_200_OK) -> dict:
+    return {
+        'status_code': status_code,
+        'transaction': 'Successful',
+        'counts': dict(Counter(result['status'] for result in results)),
+        'results': results,
+    }
@@ -0,0 +1,115 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.data_version import DataVersion
+
+
+async def data_version(db: AsyncSession, *tables: str) -> tuple[int, ...]:
+    """Текущие версии таблиц из data_version (0, если таблицу ещё не меняли)."""
+    result = await db.execute(
+        select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(tables))
+    )
+    versions = dict(result.all())
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+class VersionedCache:
+    """Кэш результатов в памяти процесса, действительный, пока не сменилась версия данных.
+
+    Хранит не больше max_entries ключей, самые давно использованные вытесняются.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple[Any, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, version: Any) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: Hashable, version: Any, value: Any):
+        self._entries[key] = (version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class ReferenceCache:
+    """Справочники имя -> id (марки, склады, штабели) в памяти процесса.
+
+    Словарь действителен, пока не сменилась версия его таблиц в data_version, —
+    так изменения из других процессов видны сразу, а проверка стоит одного
+    короткого запроса. Справочник больше max_entries не кэшируется и каждый раз
+    читается из базы.
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._maps: dict[str, tuple[tuple[int, ...], dict]] = {}
+
+    async def get(
+        self,
+        name: str,
+        loader: Callable[[AsyncSession], Awaitable[dict]],
+        db: AsyncSession,
+        tables: tuple[str, ...] = (),
+    ) -> dict:
+        """Отдаёт словарь из кэша или загружает его через loader. Словарь общий — не изменять.
+
+        tables — таблицы, из которых собирается словарь (по умолчанию одна таблица name).
+        """
+        # версию читаем до загрузки: если справочник поменяют в промежутке,
+        # словарь окажется новее версии и просто перечитается при следующем обращении
+        version = await data_version(db, *(tables or (name,)))
+        entry = self._maps.get(name)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        mapping = await loader(db)
+        if len(mapping) <= self.max_entries:
+            self._maps[name] = (version, mapping)
+        return mapping
+
+    def invalidate(self, *names: str):
+        # необязательно — версия и так сменится; освобождает память сразу после записи
+        for name in names:
+            self._maps.pop(name, None)
+
+
+reference_cache = ReferenceCache()
+
+
+async def table_etag(db: AsyncSession, *tables: str, variant: str = 'json') -> str:
+    """Слабый ETag из версий таблиц, из которых собирается ответ.
+
+    variant — формат ответа: у JSON и Arrow одной версии данных теги разные.
+    """
+    versions = await data_version(db, *tables)
+    tag = '-'.join(f'{table}.{version}' for table, version in zip(tables, versions))
+    if variant != 'json':
+        tag += f'-{variant}'
+    return f'W/"{tag}"'
+
+
+def etag_headers(etag: str) -> dict:
+    # no-cache: клиент может хранить ответ, но каждый раз сверяет ETag
+    return {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept'}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304, если клиент прислал в If-None-Match тот же ETag, иначе None."""
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return None
+    # сравнение слабое: W/ у клиентских тегов не учитываем
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    if '*' in tags or etag.removeprefix('W/') in tags:
+        return Response(status_code=304, headers=etag_headers(etag))
+    return None
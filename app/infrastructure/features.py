@@ -0,0 +1,151 @@
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# Для каждого отмеченного штабеля: первый день данных, дата формирования, с какого дня
+# пересчитывать и накопленные значения на день раньше (чтобы не проходить историю заново).
+# Строки признаков идут без пропусков от first_day до последнего пересчитанного дня,
+# поэтому start_day не позже last_day + 1, а строка за start_day - 1 существует.
+_RANGES_SQL = text("""
+    WITH dirty AS (
+        SELECT * FROM unnest(CAST(:stack_ids AS int[]), CAST(:from_days AS date[])) AS d(stack_id, from_day)
+    ),
+    bounds AS (
+        SELECT d.stack_id, d.from_day, s.formation_date,
+               least(s.first_day, t.first_day) AS first_day,
+               (SELECT max(f.day) FROM stack_day_feature f WHERE f.stack_id = d.stack_id) AS last_day
+        FROM dirty d
+        LEFT JOIN LATERAL (
+            SELECT least(min(warehouse_date), min(ship_date)) AS first_day,
+                   min(warehouse_date) FILTER (WHERE NULLIF(warehouse_weight, 'NaN') > 0) AS formation_date
+            FROM supplies WHERE stack_id = d.stack_id
+        ) s ON true
+        LEFT JOIN LATERAL (
+            SELECT min(act_date) AS first_day FROM temperature WHERE stack_id = d.stack_id
+        ) t ON true
+    ),
+    ranges AS (
+        SELECT stack_id, first_day, formation_date,
+               -- данных у штабеля не осталось: строки только удаляются (greatest пропускает NULL)
+               CASE WHEN first_day IS NULL THEN NULL
+                    WHEN last_day IS NULL THEN first_day
+                    ELSE greatest(first_day, least(from_day, last_day + 1)) END AS start_day
+        FROM bounds
+    )
+    SELECT r.stack_id, r.first_day, r.start_day, r.formation_date,
+           coalesce(f.current_weight, 0) AS seed_weight,
+           f.day - f.days_since_last_measurement AS seed_measurement
+    FROM ranges r
+    LEFT JOIN stack_day_feature f
+        ON f.stack_id = r.stack_id AND f.day = r.start_day - 1 AND r.start_day > r.first_day
+""")
+
+# Устаревшие строки: всё до нового первого дня и начиная с start_day
+_DELETE_SQL = text("""
+    DELETE FROM stack_day_feature f
+    USING unnest(CAST(:stack_ids AS int[]), CAST(:first_days AS date[]), CAST(:start_days AS date[]))
+        AS r(stack_id, first_day, start_day)
+    WHERE f.stack_id = r.stack_id
+      AND (r.first_day IS NULL OR f.day < r.first_day OR f.day >= r.start_day)
+""")
+
+# Признаки как в data_proccessing.ipynb (шаги 6–8), но только с start_day по until.
+# NaN старых загрузок — как fillna(0) в ноутбуке: для numeric NaN > 0 истинно, поэтому NULLIF
+_INSERT_SQL = text("""
+    WITH r AS (
+        SELECT * FROM unnest(
+            CAST(:stack_ids AS int[]), CAST(:start_days AS date[]), CAST(:formation_dates AS date[]),
+            CAST(:seed_weights AS numeric[]), CAST(:seed_measurements AS date[])
+        ) AS r(stack_id, start_day, formation_date, seed_weight, seed_measurement)
+        WHERE start_day <= CAST(:until AS date)
+    ),
+    days AS (
+        SELECT r.stack_id, g.day::date AS day
+        FROM r, generate_series(r.start_day, CAST(:until AS date), interval '1 day') AS g(day)
+    ),
+    added AS (
+        SELECT s.stack_id, s.warehouse_date AS day, sum(s.warehouse_weight) AS weight
+        FROM supplies s JOIN r ON r.stack_id = s.stack_id
+        WHERE s.warehouse_date BETWEEN r.start_day AND CAST(:until AS date) AND NULLIF(s.warehouse_weight, 'NaN') > 0
+        GROUP BY 1, 2
+    ),
+    removed AS (
+        SELECT s.stack_id, s.ship_date AS day, sum(s.ship_weight) AS weight
+        FROM supplies s JOIN r ON r.stack_id = s.stack_id
+        WHERE s.ship_date BETWEEN r.start_day AND CAST(:until AS date) AND NULLIF(s.ship_weight, 'NaN') > 0
+        GROUP BY 1, 2
+    ),
+    temps AS (
+        SELECT t.stack_id, t.act_date AS day, max(t.max_temperature) AS temperature
+        FROM temperature t JOIN r ON r.stack_id = t.stack_id
+        WHERE t.act_date BETWEEN r.start_day AND CAST(:until AS date) AND NULLIF(t.max_temperature, 'NaN') IS NOT NULL
+        GROUP BY 1, 2
+    )
+    INSERT INTO stack_day_feature (
+        stack_id, day, temp_measure_max, added_today, removed_today, current_weight,
+        stack_age_days, days_since_last_measurement, updated_at
+    )
+    SELECT d.stack_id, d.day, t.temperature,
+           coalesce(a.weight, 0), coalesce(rm.weight, 0),
+           r.seed_weight + sum(coalesce(a.weight, 0) - coalesce(rm.weight, 0)) OVER w,
+           CASE WHEN r.formation_date IS NOT NULL THEN greatest(d.day - r.formation_date, 0) END,
+           d.day - coalesce(max(t.day) OVER w, r.seed_measurement),
+           now()
+    FROM days d
+    JOIN r ON r.stack_id = d.stack_id
+    LEFT JOIN added a ON a.stack_id = d.stack_id AND a.day = d.day
+    LEFT JOIN removed rm ON rm.stack_id = d.stack_id AND rm.day = d.day
+    LEFT JOIN temps t ON t.stack_id = d.stack_id AND t.day = d.day
+    WINDOW w AS (PARTITION BY d.stack_id ORDER BY d.day)
+""")
+
+
+async def refresh_stack_features(db: AsyncSession, until: Optional[date] = None) -> dict:
+    """Досчитывает stack_day_feature по очереди stack_feature_dirty до дня until (по умолчанию завтра).
+
+    Пересчитываются только отмеченные штабели и только дни начиная с самого раннего
+    изменения; остальные штабели лишь дописываются новыми днями до until.
+    """
+    started = time.perf_counter()
+    until = until or date.today() + timedelta(days=1)
+
+    # штабели без изменений тоже нужно довести до until
+    await db.execute(text("""
+        INSERT INTO stack_feature_dirty (stack_id, from_day)
+        SELECT stack_id, max(day) + 1 FROM stack_day_feature GROUP BY stack_id HAVING max(day) < :until ORDER BY stack_id
+        ON CONFLICT (stack_id) DO UPDATE SET from_day = least(stack_feature_dirty.from_day, EXCLUDED.from_day)
+    """), {'until': until})
+    # забираем очередь; записи, появившиеся после, достанутся следующему пересчёту
+    dirty = (await db.execute(text("DELETE FROM stack_feature_dirty RETURNING stack_id, from_day"))).all()
+    if not dirty:
+        await db.commit()
+        return {'stacks': 0, 'rows': 0, 'until': until, 'seconds': round(time.perf_counter() - started, 3)}
+
+    ranges = (await db.execute(_RANGES_SQL, {
+        'stack_ids': [row.stack_id for row in dirty],
+        'from_days': [row.from_day for row in dirty],
+    })).all()
+    await db.execute(_DELETE_SQL, {
+        'stack_ids': [row.stack_id for row in ranges],
+        'first_days': [row.first_day for row in ranges],
+        'start_days': [row.start_day for row in ranges],
+    })
+    result = await db.execute(_INSERT_SQL, {
+        'stack_ids': [row.stack_id for row in ranges],
+        'start_days': [row.start_day for row in ranges],
+        'formation_dates': [row.formation_date for row in ranges],
+        'seed_weights': [row.seed_weight for row in ranges],
+        'seed_measurements': [row.seed_measurement for row in ranges],
+        'until': until,
+    })
+    await db.commit()
+    return {
+        'stacks': len(ranges),
+        'rows': result.rowcount,
+        'until': until,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from io import BytesIO
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+import pandas as pd
+from fastapi import HTTPException
+from sqlalchemy import Table, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.brand import Brand
+from app.models.uploaded_file import UploadedFile
+from app.models.stack import Stack
+from app.models.warehouse import Warehouse
+from app.infrastructure.validation import count_failed
+from app.infrastructure.cache import reference_cache
+
+# Сколько строчных ошибок отдаём в ответе, остальные только считаем
+MAX_REPORTED_ERRORS = 1000
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc', '.arrows')
+
+
+def detect_format(source: BinaryIO, filename: Optional[str]) -> str:
+    """csv / parquet / arrow — по расширению, а если оно ничего не говорит, по сигнатуре файла."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if extension in ARROW_EXTENSIONS:
+        return 'arrow'
+
+    magic = source.read(6)
+    source.seek(0)
+    if magic[:4] == b'PAR1':
+        return 'parquet'
+    if magic == b'ARROW1' or magic[:4] == b'\xff\xff\xff\xff':
+        return 'arrow'
+    return 'csv'
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise HTTPException(status_code=400, detail="Для загрузки Parquet/Arrow на сервере должен быть установлен pyarrow")
+    return pyarrow
+
+
+def _arrow_to_frame(data, offset: int = 0) -> pd.DataFrame:
+    # даты сразу в datetime64, без python-объектов date на каждую ячейку;
+    # индекс продолжается между кусками, как у pd.read_csv(chunksize=...)
+    df = data.to_pandas(date_as_object=False)
+    df.index += offset
+    return df
+
+
+def _open_arrow(pa, source: BinaryIO):
+    # Arrow IPC бывает в файловом формате (ARROW1...) и в потоковом
+    magic = source.read(6)
+    source.seek(0)
+    if magic == b'ARROW1':
+        return pa.ipc.open_file(source)
+    return pa.ipc.open_stream(source)
+
+
+def iter_upload_frames(source: BinaryIO, filename: Optional[str], dtype: dict, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Читает загруженный файл кусками не больше chunk_size строк.
+
+    CSV разбирается pandas, Parquet и Arrow IPC читаются pyarrow без разбора текста:
+    колонки уже типизированы, поэтому dtype применяется только к CSV.
+    """
+    file_format = detect_format(source, filename)
+    try:
+        if file_format == 'csv':
+            yield from pd.read_csv(source, dtype=dtype, chunksize=chunk_size)
+        elif file_format == 'parquet':
+            pa = _import_pyarrow()
+            offset = 0
+            for batch in pa.parquet.ParquetFile(source).iter_batches(batch_size=chunk_size):
+                yield _arrow_to_frame(batch, offset)
+                offset += batch.num_rows
+        else:
+            pa = _import_pyarrow()
+            reader = _open_arrow(pa, source)
+            batches = (
+                (reader.get_batch(i) for i in range(reader.num_record_batches))
+                if isinstance(reader, pa.ipc.RecordBatchFileReader) else reader
+            )
+            offset = 0
+            for batch in batches:
+                for start in range(0, batch.num_rows, chunk_size):
+                    part = batch.slice(start, chunk_size)
+                    yield _arrow_to_frame(part, offset)
+                    offset += part.num_rows
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Ошибка разбора файла: {e}")
+
+
+def read_upload_frame(source: BinaryIO, filename: Optional[str], dtype: dict) -> pd.DataFrame:
+    """Читает загруженный файл (CSV, Parquet или Arrow IPC) целиком."""
+    file_format = detect_format(source, filename)
+    try:
+        if file_format == 'csv':
+            return pd.read_csv(source, dtype=dtype)
+        pa = _import_pyarrow()
+        if file_format == 'parquet':
+            return _arrow_to_frame(pa.parquet.read_table(source))
+        return _arrow_to_frame(_open_arrow(pa, source).read_all())
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Ошибка разбора файла: {e}")
+
+
+async def _query_brand_ids(db: AsyncSession) -> dict[str, int]:
+    result = await db.execute(select(Brand.name, Brand.id))
+    return {name: brand_id for name, brand_id in result.all()}
+
+
+async def _query_warehouse_ids(db: AsyncSession) -> dict[str, int]:
+    result = await db.execute(select(Warehouse.name, Warehouse.id))
+    return {name: warehouse_id for name, warehouse_id in result.all()}
+
+
+async def _query_stack_ids(db: AsyncSession) -> dict[tuple[str, str], int]:
+    result = await db.execute(
+        select(Warehouse.name, Stack.name, Stack.id).join(Stack.warehouse)
+    )
+    return {(warehouse_name, stack_name): stack_id for warehouse_name, stack_name, stack_id in result.all()}
+
+
+# Справочники берутся из reference_cache и перечитываются при смене версии их таблиц
+async def load_brand_ids(db: AsyncSession) -> dict[str, int]:
+    return await reference_cache.get('brand', _query_brand_ids, db)
+
+
+async def load_warehouse_ids(db: AsyncSession) -> dict[str, int]:
+    return await reference_cache.get('warehouse', _query_warehouse_ids, db)
+
+
+async def load_stack_ids(db: AsyncSession) -> dict[tuple[str, str], int]:
+    return await reference_cache.get('stack', _query_stack_ids, db, tables=('stack', 'warehouse'))
+
+
+def error_report(inserted: int, errors: list[dict], failed: int | None = None, updated: int = 0) -> dict:
+    return {
+        "status": "ok",
+        "inserted": inserted,
+        "updated": updated,
+        "failed": count_failed(errors) if failed is None else failed,
+        "errors": errors[:MAX_REPORTED_ERRORS],
+    }
+
+
+async def copy_dataframe(db: AsyncSession, table_name: str, df: pd.DataFrame, columns: list[str]) -> int:
+    """Пишет колонки DataFrame в таблицу одним COPY в текущей транзакции сессии."""
+    if df.empty:
+        return 0
+
+    buffer = BytesIO()
+    df.to_csv(buffer, columns=columns, header=False, index=False, na_rep=r'\N', date_format='%Y-%m-%d', encoding='utf-8')
+    buffer.seek(0)
+
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_to_table(
+        table_name, source=buffer, columns=columns, format='csv', null=r'\N'
+    )
+    return len(df)
+
+
+async def upsert_dataframe(db: AsyncSession, table: Table, df: pd.DataFrame, columns: list[str], key_columns: list[str]) -> tuple[int, int]:
+    """Загружает строки через COPY во временную таблицу и переносит их в table
+    через INSERT ... ON CONFLICT по естественному ключу key_columns.
+
+    Возвращает (вставлено, обновлено); строки, совпавшие с уже сохранёнными, не трогаются.
+    """
+    # внутри одного файла оставляем последнюю строку по ключу, иначе ON CONFLICT
+    # упадёт на попытке обновить одну и ту же запись дважды
+    df = df.drop_duplicates(subset=key_columns, keep='last')
+    if df.empty:
+        return 0, 0
+
+    stage = f"_stage_{table.name}_{uuid.uuid4().hex[:8]}"
+    await db.execute(text(
+        f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {', '.join(columns)} FROM {table.name} WITH NO DATA"
+    ))
+    await copy_dataframe(db, stage, df, columns)
+
+    update_columns = [c for c in columns if c not in key_columns]
+    changed = ' OR '.join(f"{table.name}.{c} IS DISTINCT FROM EXCLUDED.{c}" for c in update_columns) or 'false'
+    result = await db.execute(text(f"""
+        WITH upserted AS (
+            INSERT INTO {table.name} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM {stage}
+            ON CONFLICT ({', '.join(key_columns)}) DO UPDATE
+            SET {', '.join(f"{c} = EXCLUDED.{c}" for c in update_columns)}
+            WHERE {changed}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted
+    """))
+    inserted, updated = result.one()
+    await db.execute(text(f"DROP TABLE {stage}"))
+    return inserted, updated
+
+
+async def file_fingerprint(source: BinaryIO) -> str:
+    """sha256 содержимого файла; после подсчёта файл перематывается в начало."""
+    def digest():
+        sha256 = hashlib.sha256()
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            sha256.update(block)
+        source.seek(0)
+        return sha256.hexdigest()
+
+    return await asyncio.to_thread(digest)
+
+
+async def find_uploaded_file(db: AsyncSession, kind: str, sha256: str) -> Optional[UploadedFile]:
+    result = await db.execute(
+        select(UploadedFile).where(UploadedFile.kind == kind, UploadedFile.sha256 == sha256)
+    )
+    return result.scalars().first()
+
+
+async def find_pending_upload(db: AsyncSession, kind: str, sha256: str, force: bool, dry_run: bool) -> tuple[Optional[dict], Optional[set[int]]]:
+    """Проверка повторной загрузки: (отчёт duplicate, если файл уже загружен целиком; строки для догрузки).
+
+    Если в прошлый раз часть строк не прошла проверку, файл загружается снова,
+    но только эти строки — остальные уже в базе.
+    """
+    if force or dry_run:
+        return None, None
+    uploaded = await find_uploaded_file(db, kind, sha256)
+    if uploaded is None:
+        return None, None
+    if not uploaded.failed_rows:
+        return duplicate_report(uploaded), None
+    # номера строк, а не сам объект: потоковая загрузка коммитит по кускам и он устаревает
+    return None, set(uploaded.failed_rows)
+
+
+def only_failed_rows(df: pd.DataFrame, retry_rows: Optional[set[int]]) -> pd.DataFrame:
+    # номера строк как в таблице ошибок validate_frame: индекс + заголовок + нумерация с 1
+    if retry_rows is None:
+        return df
+    return df[(df.index + 2).isin(retry_rows)]
+
+
+async def register_uploaded_file(db: AsyncSession, kind: str, sha256: str, filename: Optional[str], rows: int, failed_rows: Iterable[int] = ()):
+    """Запоминает отпечаток файла и строки, которые не удалось загрузить (для повторной загрузки)."""
+    statement = insert(UploadedFile).values(
+        kind=kind, sha256=sha256, filename=filename, rows=rows, failed_rows=sorted(failed_rows)
+    )
+    await db.execute(statement.on_conflict_do_update(
+        constraint='uix_uploaded_file_kind_sha256',
+        set_={'failed_rows': statement.excluded.failed_rows},
+    ))
+
+
+def duplicate_report(uploaded: UploadedFile) -> dict:
+    return {
+        "status": "duplicate",
+        "inserted": 0,
+        "updated": 0,
+        "uploaded_file_id": uploaded.id,
+        "uploaded_at": uploaded.uploaded_at,
+    }
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException, UploadFile, status
+
+from app.alchemy.db import async_session_maker
+from app.schemas.job import ImportJob
+
+# Одновременно выполняемых импортов; остальные ждут в очереди, чтобы не
+# забирать все соединения пула у читающих эндпоинтов
+MAX_CONCURRENT_IMPORTS = 2
+# Сколько последних задач хранить для /jobs
+MAX_KEPT_JOBS = 500
+
+ImportHandler = Callable[..., Awaitable[dict]]
+
+# Очередь и статусы задач живут в памяти процесса: фоновый режим (background=true)
+# рассчитан на один воркер uvicorn. При нескольких воркерах GET /jobs/{job_id}
+# может попасть в другой процесс и вернуть 404, а лимит MAX_CONCURRENT_IMPORTS
+# действует на каждый процесс отдельно.
+_jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+_tasks: set[asyncio.Task] = set()
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENT_IMPORTS)
+    return _semaphore
+
+
+def get_job(job_id: str) -> Optional[ImportJob]:
+    return _jobs.get(job_id)
+
+
+def list_jobs() -> list[ImportJob]:
+    return list(reversed(_jobs.values()))
+
+
+def _remember(job: ImportJob):
+    _jobs[job.id] = job
+    while len(_jobs) > MAX_KEPT_JOBS:
+        oldest_id, oldest = next(iter(_jobs.items()))
+        if oldest.status in ('queued', 'running'):
+            break
+        _jobs.pop(oldest_id)
+
+
+async def _run(job: ImportJob, handler: ImportHandler, path: Optional[str], kwargs: dict):
+    try:
+        async with _get_semaphore():
+            job.status = 'running'
+            job.started_at = datetime.now()
+            async with async_session_maker() as db:
+                if path is None:
+                    job.result = await handler(db, progress=job.advance, **kwargs)
+                else:
+                    with open(path, 'rb') as source:
+                        job.result = await handler(db, source, progress=job.advance, **kwargs)
+            job.errors = job.result.pop('errors', [])
+            job.status = 'done'
+    except HTTPException as e:
+        job.status = 'failed'
+        job.errors = [{'error': e.detail}]
+    except Exception as e:
+        job.status = 'failed'
+        job.errors = [{'error': str(e)}]
+    finally:
+        job.finished_at = datetime.now()
+        if path is not None:
+            os.remove(path)
+
+
+def _start(job: ImportJob, handler: ImportHandler, path: Optional[str], kwargs: dict) -> ImportJob:
+    _remember(job)
+    task = asyncio.create_task(_run(job, handler, path, kwargs))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+
+async def submit_import(kind: str, file: UploadFile, handler: ImportHandler, **kwargs) -> ImportJob:
+    """Сохраняет загруженный файл во временный и ставит импорт в фоновую очередь.
+
+    handler вызывается как handler(db, source, progress=..., **kwargs) со своей сессией.
+    """
+    with tempfile.NamedTemporaryFile(prefix=f'{kind}-', delete=False) as tmp:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, tmp)
+
+    job = ImportJob(id=uuid.uuid4().hex, kind=kind, filename=file.filename, created_at=datetime.now())
+    return _start(job, handler, tmp.name, kwargs)
+
+
+def submit_task(kind: str, handler: ImportHandler, **kwargs) -> ImportJob:
+    """Ставит в ту же фоновую очередь задачу без файла (например, очистку данных).
+
+    handler вызывается как handler(db, progress=..., **kwargs) со своей сессией.
+    """
+    job = ImportJob(id=uuid.uuid4().hex, kind=kind, created_at=datetime.now())
+    return _start(job, handler, None, kwargs)
+
+
+def accepted(job: ImportJob) -> dict:
+    return {
+        'status_code': status.HTTP_202_ACCEPTED,
+        'job_id': job.id,
+        'status': job.status,
+    }
@@ -0,0 +1,25 @@
+from fastapi import HTTPException
+from sqlalchemy import Integer, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+
+# Сколько id можно запросить за один раз
+MAX_BATCH_IDS = 1000
+
+
+def parse_ids(values: list[str]) -> list[int]:
+    """id из ?ids=1,2,3 и/или ?ids=1&ids=2, без повторов, в порядке запроса."""
+    ids = []
+    try:
+        for value in values:
+            ids += [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный список id")
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Можно запросить не больше {MAX_BATCH_IDS} id")
+    return ids
+
+
+def id_in(column, ids: list[int]):
+    """column = ANY(:ids): один параметр-массив, план запроса не зависит от числа id."""
+    return column == any_(bindparam('ids', ids, type_=ARRAY(Integer)))
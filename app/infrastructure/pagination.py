@@ -0,0 +1,44 @@
+import base64
+import json
+from collections.abc import Mapping
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Select
+
+# Размер страницы по умолчанию и максимальный, который можно запросить
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(last_id: int) -> str:
+    """Непрозрачный токен следующей страницы: id последней отданной строки."""
+    return base64.urlsafe_b64encode(json.dumps({'id': last_id}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))['id'])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def keyset_page(query: Select, id_column, limit: int, cursor: Optional[str]) -> Select:
+    """Страница по ключу: WHERE id > курсор ORDER BY id LIMIT limit + 1.
+
+    Лишняя строка нужна только чтобы понять, есть ли следующая страница;
+    стоимость запроса не зависит от того, насколько далеко листают.
+    """
+    if cursor:
+        query = query.where(id_column > decode_cursor(cursor))
+    return query.order_by(id_column).limit(limit + 1)
+
+
+def page_response(rows: list, limit: int) -> dict:
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last['id'] if isinstance(last, Mapping) else last.id)
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,77 @@
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.infrastructure.cache import reference_cache
+
+# Строк за одну транзакцию: блокировки держатся недолго, запись в эти таблицы не встаёт
+PURGE_CHUNK = 5_000
+
+# Таблицы со stack_id, которые чистим пачками; stack_inventory и очередь признаков
+# (по строке на штабель) уходят каскадом вместе со штабелем
+DEPENDENT_TABLES = ('temperature', 'supplies', 'predict', 'current_predict', 'stack_day_feature')
+
+
+async def _delete_chunked(
+    db: AsyncSession,
+    table: str,
+    stack_ids: list[int],
+    chunk: int,
+    progress: Optional[Callable[[int], None]],
+) -> int:
+    # ctid вместо id — у stack_day_feature составной ключ
+    statement = text(f"""
+        DELETE FROM {table} WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM {table} WHERE stack_id = ANY(CAST(:stack_ids AS int[])) LIMIT :chunk
+        ))
+    """)
+    total = 0
+    while True:
+        deleted = (await db.execute(statement, {'stack_ids': stack_ids, 'chunk': chunk})).rowcount
+        await db.commit()
+        total += deleted
+        if progress:
+            progress(deleted)
+        if deleted < chunk:
+            return total
+
+
+async def purge_stacks(
+    db: AsyncSession,
+    stack_ids: list[int],
+    progress: Optional[Callable[[int], None]] = None,
+    chunk: int = PURGE_CHUNK,
+) -> dict:
+    """Удаляет штабели: сначала зависимые строки пачками по chunk в отдельных транзакциях, затем сами штабели.
+
+    Если данные подгрузят во время очистки, их заберёт каскад по внешнему ключу при удалении штабеля.
+    """
+    deleted = {}
+    for table in DEPENDENT_TABLES:
+        deleted[table] = await _delete_chunked(db, table, stack_ids, chunk, progress)
+    result = await db.execute(
+        text("DELETE FROM stack WHERE id = ANY(CAST(:stack_ids AS int[]))"), {'stack_ids': stack_ids}
+    )
+    await db.commit()
+    deleted['stack'] = result.rowcount
+    reference_cache.invalidate('stack')
+    return {'deleted': deleted}
+
+
+async def purge_warehouse(
+    db: AsyncSession,
+    warehouse_id: int,
+    progress: Optional[Callable[[int], None]] = None,
+    chunk: int = PURGE_CHUNK,
+) -> dict:
+    """Выводит склад из эксплуатации: очищает все его штабели через purge_stacks и удаляет сам склад."""
+    stack_ids = list((await db.execute(
+        text("SELECT id FROM stack WHERE warehouse_id = :warehouse_id"), {'warehouse_id': warehouse_id}
+    )).scalars())
+    result = await purge_stacks(db, stack_ids, progress=progress, chunk=chunk)
+    deleted = await db.execute(text("DELETE FROM warehouse WHERE id = :warehouse_id"), {'warehouse_id': warehouse_id})
+    await db.commit()
+    result['deleted']['warehouse'] = deleted.rowcount
+    reference_cache.invalidate('warehouse', 'stack')
+    return result
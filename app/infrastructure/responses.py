@@ -0,0 +1,112 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    # DECIMAL из базы отдаём числом; NaN и бесконечности в JSON не представимы
+    if isinstance(value, Decimal):
+        return None if value.is_nan() or value.is_infinite() else float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Неизвестный тип {type(value)}")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ без jsonable_encoder: содержимое (dict/list из строк выборки)
+    сериализуется напрямую через orjson, а без него — через стандартный json.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            content, default=_default, ensure_ascii=False, allow_nan=False, separators=(',', ':')
+        ).encode('utf-8')
+
+
+# Форматы табличных ответов: JSON-список строк (по умолчанию), JSON по колонкам и Arrow IPC
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+COLUMNS_MEDIA_TYPE = 'application/vnd.glowbyte.columns+json'
+RESPONSE_FORMATS = ('json', 'columns', 'arrow')
+
+
+def response_format(request: Request) -> str:
+    """Формат ответа: параметр ?format=json|columns|arrow, иначе заголовок Accept."""
+    requested = request.query_params.get('format')
+    if requested in RESPONSE_FORMATS:
+        return requested
+    accept = request.headers.get('accept', '')
+    if ARROW_MEDIA_TYPE in accept:
+        return 'arrow'
+    if COLUMNS_MEDIA_TYPE in accept:
+        return 'columns'
+    return 'json'
+
+
+def _arrow_type(pa, column):
+    # тип колонки Arrow по типу SQL, чтобы даже пустая или целиком NULL колонка была типизирована
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+    if python_type is int:
+        return pa.int64()
+    if python_type in (float, Decimal):
+        return pa.float64()
+    if python_type is datetime:
+        return pa.timestamp('us')
+    if python_type is date:
+        return pa.date32()
+    if python_type is str:
+        return pa.string()
+    return None
+
+
+def _arrow_stream(rows: list[dict], columns) -> bytes:
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError:
+        raise HTTPException(status_code=406, detail="Для ответа в формате Arrow на сервере должен быть установлен pyarrow")
+
+    data = {}
+    for column in columns:
+        values = [row[column.name] for row in rows]
+        if any(isinstance(value, Decimal) for value in values):
+            values = [_default(value) if isinstance(value, Decimal) else value for value in values]
+        data[column.name] = pa.array(values, type=_arrow_type(pa, column))
+    table = pa.table(data)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def table_response(request: Request, rows: list[dict], columns, headers: Optional[dict] = None, **page) -> Response:
+    """Табличный ответ в формате, который попросил клиент.
+
+    columns — выбранные колонки запроса (select.selected_columns), по ним
+    строится схема Arrow. page — поля страницы (next_cursor): в JSON они идут рядом с items / columns,
+    в Arrow — заголовками X-Next-Cursor.
+    """
+    headers = {**(headers or {}), 'Vary': 'Accept'}
+    fmt = response_format(request)
+    if fmt == 'arrow':
+        if page.get('next_cursor'):
+            headers['X-Next-Cursor'] = page['next_cursor']
+        return Response(_arrow_stream(rows, columns), media_type=ARROW_MEDIA_TYPE, headers=headers)
+    if fmt == 'columns':
+        content = {"columns": {column.name: [row[column.name] for row in rows] for column in columns}, **page}
+        return FastJSONResponse(content, media_type=COLUMNS_MEDIA_TYPE, headers=headers)
+    return FastJSONResponse({"items": rows, **page} if page else rows, headers=headers)
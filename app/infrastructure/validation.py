@@ -0,0 +1,136 @@
+from typing import Literal, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, status
+
+# Что делать со строками с ошибками: пропустить их и загрузить остальные или не загружать ничего
+OnError = Literal['skip', 'abort']
+
+# Граница колонок INTEGER в PostgreSQL
+INTEGER_MAX = 2 ** 31 - 1
+
+
+def _errors(df: pd.DataFrame, mask: pd.Series, column: Optional[str], message: str, values: Optional[pd.Series] = None) -> Optional[pd.DataFrame]:
+    if not mask.any():
+        return None
+    if values is None:
+        values = df[column] if column else pd.Series(None, index=df.index, dtype=object)
+    values = values[mask]
+    return pd.DataFrame({
+        'row': df.loc[mask, 'row'],
+        'column': column,
+        'value': values.astype(str).where(values.notna(), None),
+        'error': message,
+    })
+
+
+def validate_frame(
+    df: pd.DataFrame,
+    brand_ids: dict[str, int],
+    stack_ids: dict[tuple[str, str], int],
+    key_columns: list[str],
+    dates: Optional[dict[str, bool]] = None,
+    numbers: Optional[dict[str, bool]] = None,
+    integers: Optional[dict[str, bool]] = None,
+    date_format: Optional[str] = None,
+) -> tuple[pd.DataFrame, list[dict]]:
+    """Проверяет весь DataFrame векторно и за один проход собирает таблицу ошибок.
+
+    dates, numbers и integers — колонки дат, чисел и целых чисел с признаком
+    обязательности. Проверяется: разбор дат, нечисловые, пустые и бесконечные
+    значения, дробные и не помещающиеся в INTEGER целые, наличие марки и
+    штабеля в справочниках и повтор естественного ключа внутри файла (остаётся
+    последняя строка; пустой key_columns — у таблицы ключа нет, повторы допустимы).
+    Марка и штабель сопоставляются с brand_id / stack_id.
+
+    Возвращает только строки без ошибок (с приведёнными типами) и список
+    ошибок вида {row, column, value, error}; row — номер строки в исходном CSV
+    с учётом заголовка.
+    """
+    df = df.assign(
+        row=df.index + 2,
+        brand_name=df['brand_name'].astype(str),
+        warehouse_name=df['warehouse_name'].astype(str),
+        stack_number=df['stack_number'].astype(str),
+    )
+    found = []
+
+    for column, required in (dates or {}).items():
+        raw = df[column]
+        parsed = pd.to_datetime(raw, format=date_format, errors='coerce')
+        found.append(_errors(df, parsed.isna() & raw.notna(), column, 'Некорректная дата'))
+        if required:
+            found.append(_errors(df, raw.isna(), column, 'Не указана дата'))
+        # в базе все эти колонки DATE, время отбрасываем сразу
+        df[column] = parsed.dt.normalize()
+
+    integers = integers or {}
+    for column, required in {**(numbers or {}), **integers}.items():
+        raw = df[column]
+        parsed = pd.to_numeric(raw, errors='coerce').astype(float)
+        infinite = np.isinf(parsed)
+        found.append(_errors(df, parsed.isna() & raw.notna(), column, 'Не число'))
+        found.append(_errors(df, infinite, column, 'Бесконечное значение'))
+        if required:
+            found.append(_errors(df, raw.isna(), column, 'Не указано значение'))
+        df[column] = parsed.mask(infinite)
+        if column in integers:
+            finite = parsed.notna() & ~infinite
+            found.append(_errors(df, finite & (parsed != np.floor(parsed)), column, 'Не целое число'))
+            found.append(_errors(df, finite & (parsed.abs() > INTEGER_MAX), column, 'Число вне допустимого диапазона'))
+
+    # Справочники: членство в множестве известных марок и пар (склад, штабель)
+    df['brand_id'] = df['brand_name'].map(brand_ids)
+    stacks = pd.DataFrame(
+        [(warehouse_name, stack_name, stack_id) for (warehouse_name, stack_name), stack_id in stack_ids.items()],
+        columns=['warehouse_name', 'stack_number', 'stack_id'],
+    )
+    df = df.merge(stacks, how='left', on=['warehouse_name', 'stack_number']).set_index(df.index)
+    found.append(_errors(df, df['brand_id'].isna(), 'brand_name', 'Не найдена марка'))
+    found.append(_errors(
+        df, df['stack_id'].isna(), 'stack_number', 'Не найден штабель',
+        values=df['warehouse_name'] + '/' + df['stack_number'],
+    ))
+
+    found = [f for f in found if f is not None]
+    invalid = df['row'].isin(pd.concat(found)['row']) if found else pd.Series(False, index=df.index)
+
+    # Повторы ключа среди остальных строк: в базу попадёт последняя
+    if key_columns:
+        duplicated = df[~invalid].duplicated(subset=key_columns, keep='last').reindex(df.index, fill_value=False)
+        if duplicated.any():
+            found.append(_errors(df, duplicated, None, 'Повтор строки по ключу ' + ', '.join(key_columns)))
+            invalid |= duplicated
+
+    valid = df[~invalid].astype({'brand_id': int, 'stack_id': int, **{column: 'Int64' for column in integers}})
+    if not found:
+        return valid, []
+    errors = pd.concat(found, ignore_index=True).sort_values('row', kind='stable').astype({'row': int})
+    return valid, errors.to_dict('records')
+
+
+def count_failed(errors: list[dict]) -> int:
+    return len({e['row'] for e in errors})
+
+
+def validation_report(rows: int, valid: int, errors: list[dict]) -> dict:
+    return {
+        "status": "validated",
+        "rows": rows,
+        "valid": valid,
+        "failed": count_failed(errors),
+        "errors": errors,
+    }
+
+
+def reject(errors: list[dict]):
+    """on_error=abort: ничего не записано, отдаём полную таблицу ошибок."""
+    raise HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail={
+            "message": "Файл содержит ошибки, данные не загружены",
+            "failed": count_failed(errors),
+            "errors": errors,
+        }
+    )
@@ -27,6 +27,10 @@ from app.models.location import Location
 from app.models.stack import Stack
 from app.models.current_predict import CurrentPredict
 from app.models.predict import Predict
+from app.models.uploaded_file import UploadedFile
+from app.models.data_version import DataVersion
+from app.models.stack_inventory import StackInventory
+from app.models.stack_day_feature import StackDayFeature, StackFeatureDirty
 target_metadata = Base.metadata
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
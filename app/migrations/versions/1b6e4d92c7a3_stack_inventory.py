@@ -0,0 +1,108 @@
+"""stack_inventory table maintained by supplies triggers
+
+Revision ID: 1b6e4d92c7a3
+Revises: f7a2c9e03d51
+Create Date: 2026-10-18 15:41:07.318254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b6e4d92c7a3'
+down_revision: Union[str, None] = 'f7a2c9e03d51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stack_inventory',
+    sa.Column('stack_id', sa.Integer(), nullable=False),
+    sa.Column('added_weight', sa.DECIMAL(precision=15, scale=4), nullable=False),
+    sa.Column('removed_weight', sa.DECIMAL(precision=15, scale=4), nullable=False),
+    sa.Column('current_weight', sa.DECIMAL(precision=15, scale=4), sa.Computed('added_weight - removed_weight', ), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['stack_id'], ['stack.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('stack_id')
+    )
+
+    # Триггеры уровня оператора с таблицами переходов: загрузка файла целиком
+    # меняет остатки одним агрегатом по штабелям, а не построчно.
+    # При UPDATE старые строки вычитаются, новые прибавляются — так учитывается и перенос между штабелями.
+    # NaN в весах старых загрузок считаем пустым значением: иначе один NaN навсегда сделал бы остаток NaN.
+    # Строки stack_inventory блокируются по возрастанию stack_id: параллельные загрузки
+    # по пересекающимся штабелям ждут друг друга, а не попадают во взаимную блокировку.
+    op.execute("""
+        CREATE FUNCTION stack_inventory_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                DELETE FROM stack_inventory;
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM 1 FROM stack_inventory
+                WHERE stack_id IN (SELECT stack_id FROM old_rows)
+                ORDER BY stack_id FOR UPDATE;
+                UPDATE stack_inventory i
+                SET added_weight = i.added_weight - d.added_weight,
+                    removed_weight = i.removed_weight - d.removed_weight,
+                    updated_at = now()
+                FROM (
+                    SELECT stack_id, coalesce(sum(NULLIF(warehouse_weight, 'NaN')), 0) AS added_weight,
+                           coalesce(sum(NULLIF(ship_weight, 'NaN')), 0) AS removed_weight
+                    FROM old_rows WHERE stack_id IS NOT NULL GROUP BY stack_id
+                ) d
+                WHERE i.stack_id = d.stack_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO stack_inventory (stack_id, added_weight, removed_weight, updated_at)
+                SELECT stack_id, coalesce(sum(NULLIF(warehouse_weight, 'NaN')), 0), coalesce(sum(NULLIF(ship_weight, 'NaN')), 0), now()
+                FROM new_rows WHERE stack_id IS NOT NULL GROUP BY stack_id ORDER BY stack_id
+                ON CONFLICT (stack_id) DO UPDATE
+                SET added_weight = stack_inventory.added_weight + EXCLUDED.added_weight,
+                    removed_weight = stack_inventory.removed_weight + EXCLUDED.removed_weight,
+                    updated_at = now();
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    # таблицы переходов нельзя объявить у триггера на несколько событий — по триггеру на событие
+    op.execute("""
+        CREATE TRIGGER stack_inventory_insert AFTER INSERT ON supplies
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stack_inventory_apply()
+    """)
+    op.execute("""
+        CREATE TRIGGER stack_inventory_update AFTER UPDATE ON supplies
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stack_inventory_apply()
+    """)
+    op.execute("""
+        CREATE TRIGGER stack_inventory_delete AFTER DELETE ON supplies
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stack_inventory_apply()
+    """)
+    op.execute("""
+        CREATE TRIGGER stack_inventory_truncate AFTER TRUNCATE ON supplies
+        FOR EACH STATEMENT EXECUTE FUNCTION stack_inventory_apply()
+    """)
+
+    # остатки по уже загруженным поставкам
+    op.execute("""
+        INSERT INTO stack_inventory (stack_id, added_weight, removed_weight)
+        SELECT stack_id, coalesce(sum(NULLIF(warehouse_weight, 'NaN')), 0), coalesce(sum(NULLIF(ship_weight, 'NaN')), 0)
+        FROM supplies WHERE stack_id IS NOT NULL GROUP BY stack_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for event in ('insert', 'update', 'delete', 'truncate'):
+        op.execute(f"DROP TRIGGER stack_inventory_{event} ON supplies")
+    op.execute("DROP FUNCTION stack_inventory_apply()")
+    op.drop_table('stack_inventory')
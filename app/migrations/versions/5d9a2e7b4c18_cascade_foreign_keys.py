@@ -0,0 +1,93 @@
+"""ON DELETE CASCADE foreign keys
+
+Revision ID: 5d9a2e7b4c18
+Revises: 8c3f5a1e6d24
+Create Date: 2026-10-18 17:12:36.540871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d9a2e7b4c18'
+down_revision: Union[str, None] = '8c3f5a1e6d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (таблица, колонка, ссылается на) — имена ограничений по умолчанию: {таблица}_{колонка}_fkey.
+# Каскад только со стороны штабеля; ссылки на марку остаются NO ACTION — марку, по которой
+# есть данные, удалить нельзя (индекса по brand_id нет, каскад шёл бы полным просмотром таблиц)
+FOREIGN_KEYS = [
+    ('stack', 'warehouse_id', 'warehouse'),
+    ('supplies', 'stack_id', 'stack'),
+    ('temperature', 'stack_id', 'stack'),
+    ('predict', 'stack_id', 'stack'),
+    ('current_predict', 'stack_id', 'stack'),
+]
+
+
+def _replace_foreign_keys(on_delete: str) -> None:
+    # Миграция идёт одной транзакцией, и блокировка от DROP CONSTRAINT держалась бы до её
+    # конца, через все VALIDATE. В autocommit каждый ALTER — своя транзакция: эксклюзивная
+    # блокировка только на замену определения (NOT VALID), а проверка существующих строк
+    # (VALIDATE) запись в таблицу не блокирует. Повторный запуск после сбоя безопасен.
+    with op.get_context().autocommit_block():
+        for table, column, target in FOREIGN_KEYS:
+            name = f'{table}_{column}_fkey'
+            op.execute(f"""
+                ALTER TABLE {table}
+                DROP CONSTRAINT {name},
+                ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {target} (id) {on_delete} NOT VALID
+            """)
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+# При каскадном удалении штабеля триггеры supplies / temperature срабатывают уже
+# после удаления самого штабеля — такие stack_id в очередь пересчёта не ставим
+MARK_DIRTY_FUNCTION = """
+    CREATE OR REPLACE FUNCTION stack_feature_mark_dirty() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        source text;
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            INSERT INTO stack_feature_dirty (stack_id, from_day)
+            SELECT stack_id, min(day) FROM stack_day_feature GROUP BY stack_id ORDER BY stack_id
+            ON CONFLICT (stack_id) DO UPDATE SET from_day = least(stack_feature_dirty.from_day, EXCLUDED.from_day);
+            RETURN NULL;
+        END IF;
+        FOREACH source IN ARRAY CASE TG_OP
+            WHEN 'INSERT' THEN ARRAY['new_rows']
+            WHEN 'DELETE' THEN ARRAY['old_rows']
+            ELSE ARRAY['old_rows', 'new_rows'] END
+        LOOP
+            EXECUTE format($sql$
+                INSERT INTO stack_feature_dirty (stack_id, from_day)
+                SELECT r.stack_id, min(%1$s) FROM %2$I r JOIN stack s ON s.id = r.stack_id
+                WHERE %1$s IS NOT NULL GROUP BY r.stack_id ORDER BY r.stack_id
+                ON CONFLICT (stack_id) DO UPDATE SET from_day = least(stack_feature_dirty.from_day, EXCLUDED.from_day)
+            $sql$, TG_ARGV[0], source);
+        END LOOP;
+        RETURN NULL;
+    END
+    $$
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(MARK_DIRTY_FUNCTION)
+    # каскад по штабелю ищет строки current_predict по stack_id — у остальных таблиц
+    # stack_id стоит первым в уникальном ключе
+    op.create_index('ix_current_predict_stack_id', 'current_predict', ['stack_id'], unique=False, if_not_exists=True)
+    _replace_foreign_keys('ON DELETE CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # функцию триггера не возвращаем: без каскада отбрасывать нечего, фильтр ничего не меняет
+    _replace_foreign_keys('')
+    op.drop_index('ix_current_predict_stack_id', table_name='current_predict')
@@ -0,0 +1,120 @@
+"""stack_day_feature table and dirty queue triggers
+
+Revision ID: 8c3f5a1e6d24
+Revises: 1b6e4d92c7a3
+Create Date: 2026-10-18 16:27:13.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c3f5a1e6d24'
+down_revision: Union[str, None] = '1b6e4d92c7a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# таблица -> выражение самого раннего дня, который затрагивает строка
+DAY_EXPRESSIONS = {
+    'supplies': 'least(warehouse_date, ship_date)',
+    'temperature': 'act_date',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stack_day_feature',
+    sa.Column('stack_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('temp_measure_max', sa.DECIMAL(precision=5, scale=2), nullable=True),
+    sa.Column('added_today', sa.DECIMAL(precision=15, scale=4), nullable=False),
+    sa.Column('removed_today', sa.DECIMAL(precision=15, scale=4), nullable=False),
+    sa.Column('current_weight', sa.DECIMAL(precision=15, scale=4), nullable=False),
+    sa.Column('stack_age_days', sa.Integer(), nullable=True),
+    sa.Column('days_since_last_measurement', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['stack_id'], ['stack.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('stack_id', 'day')
+    )
+    op.create_table('stack_feature_dirty',
+    sa.Column('stack_id', sa.Integer(), nullable=False),
+    sa.Column('from_day', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['stack_id'], ['stack.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('stack_id')
+    )
+
+    # Триггеры только отмечают штабель и самый ранний затронутый день — сам пересчёт
+    # делает refresh_stack_features, чтобы запись поставок и температур не замедлялась.
+    # TG_ARGV[0] — выражение дня для таблицы, на которой висит триггер.
+    # Строки очереди вставляются по возрастанию stack_id, чтобы параллельные загрузки
+    # блокировали их в одном порядке и не попадали во взаимную блокировку.
+    op.execute("""
+        CREATE FUNCTION stack_feature_mark_dirty() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            source text;
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                INSERT INTO stack_feature_dirty (stack_id, from_day)
+                SELECT stack_id, min(day) FROM stack_day_feature GROUP BY stack_id ORDER BY stack_id
+                ON CONFLICT (stack_id) DO UPDATE SET from_day = least(stack_feature_dirty.from_day, EXCLUDED.from_day);
+                RETURN NULL;
+            END IF;
+            FOREACH source IN ARRAY CASE TG_OP
+                WHEN 'INSERT' THEN ARRAY['new_rows']
+                WHEN 'DELETE' THEN ARRAY['old_rows']
+                ELSE ARRAY['old_rows', 'new_rows'] END
+            LOOP
+                EXECUTE format($sql$
+                    INSERT INTO stack_feature_dirty (stack_id, from_day)
+                    SELECT stack_id, min(%1$s) FROM %2$I
+                    WHERE stack_id IS NOT NULL AND %1$s IS NOT NULL GROUP BY stack_id ORDER BY stack_id
+                    ON CONFLICT (stack_id) DO UPDATE SET from_day = least(stack_feature_dirty.from_day, EXCLUDED.from_day)
+                $sql$, TG_ARGV[0], source);
+            END LOOP;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for table, day in DAY_EXPRESSIONS.items():
+        op.execute(f"""
+            CREATE TRIGGER {table}_feature_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION stack_feature_mark_dirty('{day}')
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_feature_update AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION stack_feature_mark_dirty('{day}')
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_feature_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION stack_feature_mark_dirty('{day}')
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_feature_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION stack_feature_mark_dirty('{day}')
+        """)
+
+    # уже загруженные данные попадут в признаки при первом пересчёте
+    for table, day in DAY_EXPRESSIONS.items():
+        op.execute(f"""
+            INSERT INTO stack_feature_dirty (stack_id, from_day)
+            SELECT stack_id, min({day}) FROM {table}
+            WHERE stack_id IS NOT NULL AND {day} IS NOT NULL GROUP BY stack_id
+            ON CONFLICT (stack_id) DO UPDATE SET from_day = least(stack_feature_dirty.from_day, EXCLUDED.from_day)
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in DAY_EXPRESSIONS:
+        for event in ('insert', 'update', 'delete', 'truncate'):
+            op.execute(f"DROP TRIGGER {table}_feature_{event} ON {table}")
+    op.execute("DROP FUNCTION stack_feature_mark_dirty()")
+    op.drop_table('stack_feature_dirty')
+    op.drop_table('stack_day_feature')
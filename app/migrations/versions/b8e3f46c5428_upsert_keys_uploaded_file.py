@@ -0,0 +1,81 @@
+"""upsert keys and uploaded_file
+
+Revision ID: b8e3f46c5428
+Revises: b0b5d1dffd70
+Create Date: 2026-10-18 11:41:15.504821
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+log = logging.getLogger('alembic.runtime.migration')
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e3f46c5428'
+down_revision: Union[str, None] = 'b0b5d1dffd70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# таблица -> колонки естественного ключа. У поставок его нет: выгрузок одной марки
+# на штабель за день бывает несколько, в том числе одинаковых, — их не трогаем
+NATURAL_KEYS = {
+    'predict': ['stack_id', 'date'],
+    'temperature': ['stack_id', 'act_date', 'shift', 'picket'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('uploaded_file',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=True),
+    sa.Column('rows', sa.Integer(), nullable=True),
+    sa.Column('failed_rows', postgresql.ARRAY(sa.Integer()), nullable=True),
+    sa.Column('uploaded_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'sha256', name='uix_uploaded_file_kind_sha256')
+    )
+
+    # Убираем дубли, накопленные повторными загрузками: оставляем последнюю запись,
+    # удалённые строки переносим в {table}_duplicates (downgrade возвращает их обратно)
+    bind = op.get_bind()
+    for table, columns in NATURAL_KEYS.items():
+        op.execute(f"CREATE TABLE {table}_duplicates (LIKE {table})")
+        dropped = bind.execute(sa.text(f"""
+            WITH dropped AS (
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, row_number() OVER (PARTITION BY {', '.join(columns)} ORDER BY id DESC) AS rn
+                        FROM {table}
+                    ) ranked
+                    WHERE rn > 1
+                )
+                RETURNING *
+            )
+            INSERT INTO {table}_duplicates SELECT * FROM dropped
+        """)).rowcount
+        if dropped:
+            log.warning("%s: %d повторов по (%s) перенесены в %s_duplicates",
+                        table, dropped, ', '.join(columns), table)
+
+    op.create_unique_constraint('uix_predict_stack_date', 'predict', NATURAL_KEYS['predict'])
+    op.create_unique_constraint('uix_temperature_natural_key', 'temperature', NATURAL_KEYS['temperature'],
+                                postgresql_nulls_not_distinct=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uix_temperature_natural_key', 'temperature', type_='unique')
+    op.drop_constraint('uix_predict_stack_date', 'predict', type_='unique')
+    for table in NATURAL_KEYS:
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_duplicates")
+        op.execute(f"DROP TABLE {table}_duplicates")
+    op.drop_table('uploaded_file')
@@ -0,0 +1,29 @@
+"""predict date index
+
+Revision ID: c4a7e2d91f03
+Revises: b8e3f46c5428
+Create Date: 2026-10-18 12:05:37.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e2d91f03'
+down_revision: Union[str, None] = 'b8e3f46c5428'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # (stack_id, date) уже проиндексирован уникальным ключом uix_predict_stack_date
+    op.create_index('ix_predict_date', 'predict', ['date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_predict_date', table_name='predict')
@@ -0,0 +1,31 @@
+"""stack name trigram index
+
+Revision ID: d2f9b3a6e871
+Revises: c4a7e2d91f03
+Create Date: 2026-10-18 12:31:08.542917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f9b3a6e871'
+down_revision: Union[str, None] = 'c4a7e2d91f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_stack_name_trgm', 'stack', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stack_name_trgm', table_name='stack', postgresql_using='gin')
+    # расширение pg_trgm оставляем: его могут использовать другие объекты базы
@@ -0,0 +1,57 @@
+"""data_version table and triggers
+
+Revision ID: e5c8a1f47b20
+Revises: d2f9b3a6e871
+Create Date: 2026-10-18 12:54:22.730164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c8a1f47b20'
+down_revision: Union[str, None] = 'd2f9b3a6e871'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# таблицы, изменения которых сбрасывают кэши
+TRACKED_TABLES = ['predict', 'stack']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('data_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # Один раз на оператор (не на строку): загрузка миллиона строк увеличит версию на 1
+    op.execute("""
+        CREATE FUNCTION bump_data_version() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO data_version (name, version, updated_at) VALUES (TG_TABLE_NAME, 1, now())
+            ON CONFLICT (name) DO UPDATE SET version = data_version.version + 1, updated_at = now();
+            RETURN NULL;
+        END
+        $$
+    """)
+    for table in TRACKED_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_data_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TRACKED_TABLES:
+        op.execute(f"DROP TRIGGER {table}_data_version ON {table}")
+    op.execute("DROP FUNCTION bump_data_version()")
+    op.drop_table('data_version')
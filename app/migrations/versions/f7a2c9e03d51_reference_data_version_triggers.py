@@ -0,0 +1,38 @@
+"""data_version triggers for brand and warehouse
+
+Revision ID: f7a2c9e03d51
+Revises: e5c8a1f47b20
+Create Date: 2026-10-18 13:22:49.061538
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a2c9e03d51'
+down_revision: Union[str, None] = 'e5c8a1f47b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# stack уже отслеживается; добавляем остальные справочники для ETag
+TRACKED_TABLES = ['brand', 'warehouse']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TRACKED_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_data_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TRACKED_TABLES:
+        op.execute(f"DROP TRIGGER {table}_data_version ON {table}")
@@ -2,5 +2,9 @@ from .brand import Brand
 from .supplies import Supplies
 from .temperature import Temperature
 from .warehouse import Warehouse
+from .uploaded_file import UploadedFile
+from .data_version import DataVersion
+from .stack_inventory import StackInventory
+from .stack_day_feature import StackDayFeature, StackFeatureDirty
 
-__all__ = ['Brand', 'Supplies', 'Temperature', 'Warehouse']
+__all__ = ['Brand', 'Supplies', 'Temperature', 'Warehouse', 'UploadedFile', 'DataVersion', 'StackInventory', 'StackDayFeature', 'StackFeatureDirty']
@@ -1,14 +1,18 @@
 from app.alchemy.db import Base
-from sqlalchemy import Column, Integer, Float, String, Date, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, String, Date, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 
 class CurrentPredict(Base):
     __tablename__ = 'current_predict'
+    __table_args__ = (
+        # удаление штабеля (каскад и очистка пачками) ищет строки по stack_id
+        Index('ix_current_predict_stack_id', 'stack_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     
     brand_id = Column(Integer, ForeignKey('brand.id'))
-    stack_id = Column(Integer, ForeignKey('stack.id'))
+    stack_id = Column(Integer, ForeignKey('stack.id', ondelete='CASCADE'))
 
     date = Column(Date)
     weight = Column(Float)
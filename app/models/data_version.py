@@ -0,0 +1,11 @@
+from app.alchemy.db import Base
+from sqlalchemy import Column, BigInteger, String, DateTime, func
+
+
+class DataVersion(Base):
+    __tablename__ = 'data_version'
+
+    # Строки поддерживаются триггерами bump_data_version на отслеживаемых таблицах
+    name = Column(String(50), primary_key=True)  # Имя таблицы
+    version = Column(BigInteger, nullable=False, default=0)  # Растёт при каждом изменении таблицы
+    updated_at = Column(DateTime, server_default=func.now())  # Время последнего изменения
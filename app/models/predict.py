@@ -1,13 +1,19 @@
 from app.alchemy.db import Base
-from sqlalchemy import Column, Integer, Float, String, Date, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, String, Date, ForeignKey, DateTime, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 
 class Predict(Base):
     __tablename__ = 'predict'
+    __table_args__ = (
+        # естественный ключ для повторных загрузок
+        UniqueConstraint('stack_id', 'date', name='uix_predict_stack_date'),
+        # выборки календаря по диапазону дат; (stack_id, date) покрывает уникальный ключ выше
+        Index('ix_predict_date', 'date'),
+    )
     id = Column(Integer, primary_key=True)
     
     brand_id = Column(Integer, ForeignKey('brand.id'))
-    stack_id = Column(Integer, ForeignKey('stack.id'))
+    stack_id = Column(Integer, ForeignKey('stack.id', ondelete='CASCADE'))
 
     date = Column(Date)
     weight = Column(Float)
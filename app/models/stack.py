@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from app.alchemy.db import Base
 
@@ -7,17 +7,19 @@ class Stack(Base):
     __table_args__ = (
         # составное уникальное ограничение на (warehouse_id, name)
         UniqueConstraint('warehouse_id', 'name', name='uix_stack_warehouse_name'),
+        # триграммный индекс для поиска по подстроке названия (ILIKE '%...%')
+        Index('ix_stack_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
     )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
-    warehouse_id = Column(Integer, ForeignKey('warehouse.id'), nullable=False)
+    warehouse_id = Column(Integer, ForeignKey('warehouse.id', ondelete='CASCADE'), nullable=False)
 
     warehouse = relationship('Warehouse', back_populates='stacks')
 
-    supplies = relationship('Supplies', back_populates='stack', cascade="all, delete-orphan")
-    temperatures = relationship('Temperature', back_populates='stack', cascade="all, delete-orphan")
-    current_predicts = relationship('CurrentPredict', back_populates='stack', cascade="all, delete-orphan")
-    predicts = relationship('Predict', back_populates='stack', cascade="all, delete-orphan")
+    supplies = relationship('Supplies', back_populates='stack', cascade="all, delete-orphan", passive_deletes=True)
+    temperatures = relationship('Temperature', back_populates='stack', cascade="all, delete-orphan", passive_deletes=True)
+    current_predicts = relationship('CurrentPredict', back_populates='stack', cascade="all, delete-orphan", passive_deletes=True)
+    predicts = relationship('Predict', back_populates='stack', cascade="all, delete-orphan", passive_deletes=True)
 
     
\ No newline at end of file
@@ -0,0 +1,27 @@
+from app.alchemy.db import Base
+from sqlalchemy import Column, Integer, Date, DECIMAL, DateTime, ForeignKey, func
+
+
+class StackDayFeature(Base):
+    __tablename__ = 'stack_day_feature'
+
+    # Признаки модели по штабелю на каждый день (master grid из data_proccessing.ipynb),
+    # пересчитываются refresh_stack_features только для изменившихся штабелей
+    stack_id = Column(Integer, ForeignKey('stack.id', ondelete='CASCADE'), primary_key=True)  # Штабель
+    day = Column(Date, primary_key=True)  # День
+    temp_measure_max = Column(DECIMAL(5, 2))  # Максимальная температура замеров за день (Temp_Measure_Max)
+    added_today = Column(DECIMAL(15, 4), nullable=False)  # Выгружено на склад за день, тн (Added_Today_Tons)
+    removed_today = Column(DECIMAL(15, 4), nullable=False)  # Отгружено на суда за день, тн (Removed_Today_Tons)
+    current_weight = Column(DECIMAL(15, 4), nullable=False)  # Вес штабеля на конец дня, тн (Current_Weight_Tons)
+    stack_age_days = Column(Integer)  # Дней с первой выгрузки (Stack_Age_Days)
+    days_since_last_measurement = Column(Integer)  # Дней с последнего замера (Days_Since_Last_Measurement)
+    updated_at = Column(DateTime, server_default=func.now())  # Время пересчёта
+
+
+class StackFeatureDirty(Base):
+    __tablename__ = 'stack_feature_dirty'
+
+    # Очередь на пересчёт: триггеры supplies и temperature записывают сюда самый ранний
+    # затронутый день штабеля; признаки накопительные, поэтому пересчитываются все дни начиная с него
+    stack_id = Column(Integer, ForeignKey('stack.id', ondelete='CASCADE'), primary_key=True)  # Штабель
+    from_day = Column(Date, nullable=False)  # Первый день, требующий пересчёта
@@ -0,0 +1,13 @@
+from app.alchemy.db import Base
+from sqlalchemy import Column, Integer, DECIMAL, DateTime, ForeignKey, Computed, func
+
+
+class StackInventory(Base):
+    __tablename__ = 'stack_inventory'
+
+    # Строки поддерживаются триггерами stack_inventory_* на supplies в той же транзакции
+    stack_id = Column(Integer, ForeignKey('stack.id', ondelete='CASCADE'), primary_key=True)  # Штабель
+    added_weight = Column(DECIMAL(15, 4), nullable=False, default=0)  # Всего выгружено на склад
+    removed_weight = Column(DECIMAL(15, 4), nullable=False, default=0)  # Всего отгружено на суда
+    current_weight = Column(DECIMAL(15, 4), Computed('added_weight - removed_weight'))  # Сейчас в штабеле
+    updated_at = Column(DateTime, server_default=func.now())  # Время последнего изменения
@@ -10,7 +10,7 @@ class Supplies(Base):
     
     id = Column(Integer, primary_key=True)  # Идентификатор записи
     brand_id = Column(Integer, ForeignKey('brand.id'))  # Внешний ключ на марку
-    stack_id = Column(Integer, ForeignKey('stack.id'))  # Внешний ключ на штабель
+    stack_id = Column(Integer, ForeignKey('stack.id', ondelete='CASCADE'))  # Внешний ключ на штабель
     warehouse_date = Column(Date)  # Дата выгрузки на склад
     warehouse_weight = Column(DECIMAL(15, 4))  # Вес на складе
     ship_date = Column(Date)  # Дата погрузки на судно
@@ -24,9 +24,9 @@ class SuppliesOut(BaseModel):
     brand_id: int
     stack_id: int
     warehouse_date: date
-    warehouse_weight: Optional[Decimal]
-    ship_date: date
-    ship_weight: Optional[Decimal]
+    warehouse_weight: Optional[float]
+    ship_date: Optional[date]
+    ship_weight: Optional[float]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
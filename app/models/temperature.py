@@ -1,14 +1,19 @@
 from app.alchemy.db import Base
-from sqlalchemy import Column, ForeignKey, Integer, String, Date, Numeric, DECIMAL
+from sqlalchemy import Column, ForeignKey, Integer, String, Date, Numeric, DECIMAL, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 
 class Temperature(Base):
     __tablename__ = 'temperature'
+    __table_args__ = (
+        # естественный ключ для повторных загрузок; смена может быть пустой
+        UniqueConstraint('stack_id', 'act_date', 'shift', 'picket', name='uix_temperature_natural_key',
+                         postgresql_nulls_not_distinct=True),
+    )
     
     id = Column(Integer, primary_key=True)  # Идентификатор записи
     brand_id = Column(Integer, ForeignKey('brand.id'))  # Внешний ключ на марку
-    stack_id = Column(Integer, ForeignKey('stack.id'))  # Внешний ключ на штабель
+    stack_id = Column(Integer, ForeignKey('stack.id', ondelete='CASCADE'))  # Внешний ключ на штабель
     max_temperature = Column(DECIMAL(5, 2))  # Максимальная температура
     picket = Column(String(200))  # Пикет
     act_date = Column(Date)  # Дата акта
@@ -0,0 +1,19 @@
+from app.alchemy.db import Base
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import ARRAY
+
+
+class UploadedFile(Base):
+    __tablename__ = 'uploaded_file'
+    __table_args__ = (
+        # один и тот же файл одного типа загружается только один раз
+        UniqueConstraint('kind', 'sha256', name='uix_uploaded_file_kind_sha256'),
+    )
+
+    id = Column(Integer, primary_key=True)  # Идентификатор загрузки
+    kind = Column(String(50), nullable=False)  # Тип данных: supplies / temperature / predict
+    sha256 = Column(String(64), nullable=False)  # Хэш содержимого файла
+    filename = Column(String(255))  # Имя файла при загрузке
+    rows = Column(Integer)  # Строк в файле
+    failed_rows = Column(ARRAY(Integer))  # Номера строк, не прошедших проверку: их догружает повторная загрузка
+    uploaded_at = Column(DateTime, server_default=func.now())  # Время загрузки
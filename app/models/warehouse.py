@@ -9,4 +9,4 @@ class Warehouse(Base):
     id = Column(Integer, primary_key=True)  # Идентификатор склада
     name = Column(String(100))  # Название склада
     
-    stacks = relationship('Stack', back_populates='warehouse', cascade="all, delete-orphan")  # uselist=True по умолчанию
+    stacks = relationship('Stack', back_populates='warehouse', cascade="all, delete-orphan", passive_deletes=True)  # uselist=True по умолчанию
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, status, HTTPException, Request, UploadFile
+from fastapi import APIRouter, Depends, status, HTTPException, Request, UploadFile, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import insert, select, update, delete
+from sqlalchemy import insert, select, update, delete, func, bindparam, String
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -9,7 +10,13 @@ from app.alchemy.db_depends import get_db
 from app.models.brand import Brand
 from app.schemas.brand import CreateBrand, UpdateBrand, DeleteBrand
 import csv
-from sqlalchemy.exc import IntegrityError  
+import asyncio
+from typing import BinaryIO, Callable, Optional
+from app.infrastructure.jobs import submit_import, accepted
+from app.infrastructure.cache import table_etag, etag_headers, not_modified, reference_cache
+from app.infrastructure.responses import table_response, response_format
+from app.infrastructure.lookup import parse_ids, id_in
+from app.infrastructure.batch import execute_or_conflict
 
 
 router = APIRouter(prefix="/brand", tags=["brand"])
@@ -18,6 +25,7 @@ router = APIRouter(prefix="/brand", tags=["brand"])
 async def create_brand(db: Annotated[AsyncSession, Depends(get_db)], create_brand: CreateBrand):
     await db.execute(insert(Brand).values(name=create_brand.name))
     await db.commit()
+    reference_cache.invalidate('brand')
     return {
         'status_code': status.HTTP_201_CREATED,
         'transaction': 'Successful'
@@ -25,10 +33,24 @@ async def create_brand(db: Annotated[AsyncSession, Depends(get_db)], create_bran
 
 
 @router.get("/")
-async def get_all_brands(db: Annotated[AsyncSession, Depends(get_db)]):
-    result = await db.execute(select(Brand))
-    brands = result.scalars().all()
-    return brands
+async def get_all_brands(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
+    # Справочник меняется редко: если у клиента та же версия, отвечаем 304 без тела
+    etag = await table_etag(db, 'brand', variant=response_format(request))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    query = select(Brand.id, Brand.name)
+    result = await db.execute(query)
+    brands = [dict(row) for row in result.mappings()]
+    return table_response(request, brands, query.selected_columns, headers=etag_headers(etag))
+
+
+@router.get("/batch")
+async def get_brands_batch(request: Request, db: Annotated[AsyncSession, Depends(get_db)], ids: list[str] = Query(...)):
+    query = select(Brand.id, Brand.name).where(id_in(Brand.id, parse_ids(ids))).order_by(Brand.id)
+    result = await db.execute(query)
+    brands = [dict(row) for row in result.mappings()]
+    return table_response(request, brands, query.selected_columns)
 
 
 @router.get("/{brand_id}")
@@ -42,6 +64,7 @@ async def get_brand_by_id(brand_id: int, db: Annotated[AsyncSession, Depends(get
 async def update_brand(brand_id: int, db: Annotated[AsyncSession, Depends(get_db)], update_brand: UpdateBrand):
     await db.execute(update(Brand).where(Brand.id == brand_id).values(name=update_brand.name))
     await db.commit()
+    reference_cache.invalidate('brand')
     return {
         'status_code': status.HTTP_200_OK,
         'transaction': 'Successful' 
@@ -50,40 +73,54 @@ async def update_brand(brand_id: int, db: Annotated[AsyncSession, Depends(get_db
 
 @router.delete("/delete/{brand_id}")
 async def delete_brand(brand_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
-    await db.execute(delete(Brand).where(Brand.id == brand_id))   
+    # марку, по которой есть поставки, температуры или прогнозы, не удаляем — 409
+    await execute_or_conflict(db, delete(Brand).where(Brand.id == brand_id))
     await db.commit()
+    reference_cache.invalidate('brand')
     return {
         'status_code': status.HTTP_200_OK,
         'transaction': 'Successful' 
     }
 
+async def import_brands(db: AsyncSession, source: BinaryIO, progress: Optional[Callable[[int], None]] = None) -> dict:
+    content = await asyncio.to_thread(source.read)
+    # Декодируем байты в строку
+    text = content.decode('utf-8')
+    # Читаем CSV
+    reader = csv.DictReader(text.splitlines())
+    brands_data = list(reader)
+
+    # Вставляем весь файл одним INSERT ... SELECT unnest(...) ON CONFLICT DO NOTHING:
+    # уже существующие марки (и повторы внутри файла) просто пропускаются
+    names = [row['brand'] for row in brands_data]
+    result = await db.execute(
+        pg_insert(Brand)
+        .from_select(['name'], select(func.unnest(bindparam('names', names, type_=ARRAY(String)))))
+        .on_conflict_do_nothing(index_elements=['name'])
+        .returning(Brand.id)
+    )
+    inserted = len(result.all())
+    await db.commit()
+    reference_cache.invalidate('brand')
+    if progress:
+        progress(len(names))
+
+    return {
+        'status_code': status.HTTP_201_CREATED,
+        'transaction': 'Successful',
+        'inserted': inserted,
+        'skipped': len(names) - inserted
+    }
+
+
 @router.post("/upload")
-async def upload_brands(db: Annotated[AsyncSession, Depends(get_db)], file: UploadFile):
+async def upload_brands(db: Annotated[AsyncSession, Depends(get_db)], file: UploadFile, background: bool = False):
+    if background:
+        return accepted(await submit_import('brand', file, import_brands))
     try:
-        content = await file.read()
-        # Декодируем байты в строку
-        text = content.decode('utf-8')
-        # Читаем CSV
-        reader = csv.DictReader(text.splitlines())
-        brands_data = list(reader)
-        
-        
-        for row in brands_data:
-            try:
-                brand_data = {
-                    'name': row['brand']
-                }
-                await db.execute(insert(Brand).values(**brand_data))
-                await db.commit()
-            except IntegrityError:
-                await db.rollback()
-                continue
-        return {
-            'status_code': status.HTTP_201_CREATED,
-            'transaction': 'Successful'
-        }
+        return await import_brands(db, file.file)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,131 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from typing import AsyncIterator, Literal, Optional
+from datetime import date
+from decimal import Decimal
+import asyncio
+import json
+import math
+from app.alchemy.db import engine
+from app.models.supplies import Supplies
+from app.models.temperature import Temperature
+from app.models.predict import Predict
+from app.models.current_predict import CurrentPredict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+# таблица -> (модель, колонка даты для фильтра date_from / date_to)
+EXPORT_TABLES = {
+    'supplies': (Supplies, Supplies.warehouse_date),
+    'temperature': (Temperature, Temperature.act_date),
+    'predict': (Predict, Predict.date),
+    'current_predict': (CurrentPredict, CurrentPredict.date),
+}
+# Строк за одну выборку из серверного курсора при выгрузке NDJSON
+EXPORT_BATCH_SIZE = 5_000
+# Сколько кусков COPY может ждать отправки клиенту; дальше COPY ждёт сам
+EXPORT_QUEUE_SIZE = 16
+
+
+def _export_query(table: str, stack_id: Optional[int], date_from: Optional[date], date_to: Optional[date]):
+    model, date_column = EXPORT_TABLES[table]
+    # только колонки таблицы, без ORM-объектов
+    query = select(*model.__table__.columns).order_by(model.id)
+    if stack_id is not None:
+        query = query.where(model.stack_id == stack_id)
+    if date_from is not None:
+        query = query.where(date_column >= date_from)
+    if date_to is not None:
+        query = query.where(date_column <= date_to)
+    return query
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return None if value.is_nan() or value.is_infinite() else float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Неизвестный тип {type(value)}")
+
+
+def _ndjson_line(row: dict) -> bytes:
+    # NaN и бесконечности в JSON не представимы — отдаём null (orjson делает это сам)
+    if orjson is not None:
+        return orjson.dumps(row, default=_json_default) + b'\n'
+    row = {key: None if isinstance(value, float) and not math.isfinite(value) else value for key, value in row.items()}
+    return (json.dumps(row, default=_json_default, ensure_ascii=False, allow_nan=False) + '\n').encode('utf-8')
+
+
+async def stream_csv(query) -> AsyncIterator[bytes]:
+    """CSV через COPY (SELECT ...) TO STDOUT: строки форматирует сам Postgres.
+
+    COPY пишет куски в ограниченную очередь, генератор отдаёт их клиенту,
+    поэтому память не растёт с размером выгрузки.
+    """
+    # фильтры — только int и date, их можно безопасно подставить литералами
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=EXPORT_QUEUE_SIZE)
+
+    async with engine.connect() as connection:
+        raw_connection = await connection.get_raw_connection()
+
+        async def put(chunk):
+            # asyncpg отдаёт куски как memoryview своего буфера
+            await queue.put(bytes(chunk))
+
+        async def produce():
+            try:
+                await raw_connection.driver_connection.copy_from_query(
+                    sql, output=put, format='csv', header=True
+                )
+            finally:
+                await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+            await producer
+        finally:
+            # клиент отключился посреди выгрузки — останавливаем COPY и дожидаемся его,
+            # чтобы соединение не вернулось в пул с незавершённой командой
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+
+async def stream_ndjson(query) -> AsyncIterator[bytes]:
+    """NDJSON из серверного курсора, пачками по EXPORT_BATCH_SIZE строк."""
+    async with engine.connect() as connection:
+        result = await connection.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield b''.join(_ndjson_line(dict(row._mapping)) for row in rows)
+
+
+@router.get("/{table}")
+async def export_table(
+    table: str,
+    format: Literal['csv', 'ndjson'] = 'csv',
+    stack_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail="Таблица не найдена")
+
+    query = _export_query(table, stack_id, date_from, date_to)
+    if format == 'csv':
+        body, media_type = stream_csv(query), 'text/csv; charset=utf-8'
+    else:
+        body, media_type = stream_ndjson(query), 'application/x-ndjson'
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{table}.{format}"'},
+    )
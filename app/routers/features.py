@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Annotated, Optional
+from datetime import date
+from app.alchemy.db_depends import get_db
+from app.models.stack import Stack
+from app.models.stack_day_feature import StackDayFeature
+from app.infrastructure.features import refresh_stack_features
+from app.infrastructure.responses import table_response
+
+router = APIRouter(prefix="/features", tags=["features"])
+
+
+@router.post("/refresh")
+async def refresh_features(db: Annotated[AsyncSession, Depends(get_db)], until: Optional[date] = None):
+    # Пересчитывает только штабели, у которых менялись поставки или температуры
+    return await refresh_stack_features(db, until)
+
+
+@router.get("/stack/{stack_id}")
+async def get_stack_features(
+    request: Request,
+    stack_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    query = select(*StackDayFeature.__table__.columns).where(StackDayFeature.stack_id == stack_id)
+    if date_from is not None:
+        query = query.where(StackDayFeature.day >= date_from)
+    if date_to is not None:
+        query = query.where(StackDayFeature.day <= date_to)
+    result = await db.execute(query.order_by(StackDayFeature.day))
+    return table_response(request, [dict(row) for row in result.mappings()], query.selected_columns)
+
+
+@router.get("/day/{day}")
+async def get_day_features(
+    request: Request,
+    day: date,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    warehouse_id: Optional[int] = None,
+):
+    # Строки всех штабелей за день — вход модели для оценки риска
+    query = select(*StackDayFeature.__table__.columns).where(StackDayFeature.day == day)
+    if warehouse_id is not None:
+        query = query.join(Stack, Stack.id == StackDayFeature.stack_id).where(Stack.warehouse_id == warehouse_id)
+    result = await db.execute(query.order_by(StackDayFeature.stack_id))
+    return table_response(request, [dict(row) for row in result.mappings()], query.selected_columns)
@@ -0,0 +1,175 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, BinaryIO, Callable, Optional
+import asyncio
+import csv
+import io
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from app.alchemy.db import async_session_maker
+from app.alchemy.db_depends import get_db
+from app.infrastructure.jobs import submit_import, accepted
+from app.routers.brand import import_brands
+from app.routers.stack import import_stacks
+from app.routers.supplies import import_supplies
+from app.routers.temperature import import_temperatures
+from app.routers.predict import import_predicts
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+# вид файла -> (обработчик, колонка CSV, по которой узнаём файл, слова в имени файла)
+ARCHIVE_KINDS = {
+    'brand':       (import_brands,       'brand',                    ('brand', 'марк')),
+    'stack':       (import_stacks,       'stack',                    ('stack', 'штабел')),
+    'supplies':    (import_supplies,     'ВыгрузкаНаСклад',          ('supplies', 'поставк')),
+    'temperature': (import_temperatures, 'Максимальная температура', ('temperature', 'температур')),
+    'predict':     (import_predicts,     'Дата начала',              ('fires', 'predict', 'пожар', 'возгоран')),
+}
+# Этапы по зависимостям: марки, затем штабели, затем независимые факты параллельно
+ARCHIVE_STAGES = [['brand'], ['stack'], ['supplies', 'temperature', 'predict']]
+
+
+def classify_file(name: str, path: str) -> Optional[str]:
+    """Вид файла по заголовку CSV, а для Parquet/Arrow и нераспознанных — по имени."""
+    with open(path, 'rb') as source:
+        first_line = source.readline(64 * 1024).decode('utf-8-sig', errors='ignore')
+    header = next(csv.reader(io.StringIO(first_line)), [])
+    for kind, (_, column, _) in ARCHIVE_KINDS.items():
+        if column in header:
+            return kind
+
+    base = os.path.basename(name).lower()
+    for kind, (_, _, words) in ARCHIVE_KINDS.items():
+        if any(word in base for word in words):
+            return kind
+    return None
+
+
+def extract_archive(source: BinaryIO, directory: str) -> list[tuple[str, str]]:
+    """Распаковывает файлы архива в directory, возвращает [(имя в архиве, путь)]."""
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Файл не является zip-архивом")
+
+    files = []
+    with archive:
+        for number, member in enumerate(archive.infolist()):
+            # каталоги и служебные файлы macOS пропускаем
+            if member.is_dir() or member.filename.startswith('__MACOSX/') or os.path.basename(member.filename).startswith('.'):
+                continue
+            path = os.path.join(directory, str(number))
+            with archive.open(member) as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            files.append((member.filename, path))
+    return files
+
+
+async def _import_file(
+    db: Optional[AsyncSession],
+    kind: str,
+    name: str,
+    path: str,
+    force: bool,
+    progress: Optional[Callable[[int], None]],
+) -> dict:
+    handler = ARCHIVE_KINDS[kind][0]
+    options = {} if kind in ('brand', 'stack') else dict(filename=os.path.basename(name), force=force)
+    if kind == 'temperature':
+        # температуры бывают большими — читаем кусками
+        options['stream'] = True
+
+    report = {'file': name, 'kind': kind}
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as source:
+            if db is not None:
+                report['result'] = await handler(db, source, progress=progress, **options)
+            else:
+                # каждый независимый файл пишется через своё соединение
+                async with async_session_maker() as own_db:
+                    report['result'] = await handler(own_db, source, progress=progress, **options)
+        report['status'] = 'done'
+    except HTTPException as e:
+        report['status'] = 'failed'
+        report['error'] = e.detail
+    except Exception as e:
+        report['status'] = 'failed'
+        report['error'] = str(e)
+    finally:
+        if db is not None and report.get('status') != 'done':
+            await db.rollback()
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+async def _import_kind(db, kind, files, force, progress) -> list[dict]:
+    # файлы одного вида грузим по очереди, чтобы upsert'ы не спорили за одни строки
+    return [await _import_file(db, kind, name, path, force, progress) for name, path in files]
+
+
+async def import_archive(
+    db: AsyncSession,
+    source: BinaryIO,
+    force: bool = False,
+    progress: Optional[Callable[[int], None]] = None,
+) -> dict:
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='archive-') as directory:
+        files = await asyncio.to_thread(extract_archive, source, directory)
+
+        by_kind = {kind: [] for kind in ARCHIVE_KINDS}
+        reports = []
+        for name, path in files:
+            kind = await asyncio.to_thread(classify_file, name, path)
+            if kind is None:
+                reports.append({'file': name, 'kind': None, 'status': 'skipped', 'error': "Не удалось определить тип файла"})
+            else:
+                by_kind[kind].append((name, path))
+
+        failed_stage = None
+        for stage in ARCHIVE_STAGES:
+            kinds = [kind for kind in stage if by_kind[kind]]
+            if failed_stage:
+                # справочник не загрузился — факты на нём не проверяем и не пишем
+                for kind in kinds:
+                    reports += [
+                        {'file': name, 'kind': kind, 'status': 'skipped', 'error': f"Не загружен {failed_stage}"}
+                        for name, _ in by_kind[kind]
+                    ]
+                continue
+
+            if len(stage) == 1:
+                # справочники — в сессии запроса, последовательно
+                stage_reports = [await _import_kind(db, kind, by_kind[kind], force, progress) for kind in kinds]
+            else:
+                stage_reports = await asyncio.gather(*(
+                    _import_kind(None, kind, by_kind[kind], force, progress) for kind in kinds
+                ))
+            for kind_reports in stage_reports:
+                reports += kind_reports
+                if len(stage) == 1 and any(r['status'] == 'failed' for r in kind_reports):
+                    failed_stage = kind_reports[0]['kind']
+
+    # нераспознанные файлы (readme и т.п.) неудачей не считаем
+    failed = any(r['status'] != 'done' and r['kind'] for r in reports)
+    return {
+        'status': 'partial' if failed else 'ok',
+        'files': reports,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+@router.post("/archive")
+async def upload_archive(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    file: UploadFile = File(...),
+    background: bool = False,
+    force: bool = False,
+):
+    if background:
+        return accepted(await submit_import('archive', file, import_archive, force=force))
+    return await import_archive(db, file.file, force=force)
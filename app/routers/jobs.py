@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, status
+
+from app.infrastructure.jobs import get_job, list_jobs
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("/")
+async def get_all_jobs():
+    return [job.to_dict() for job in list_jobs()]
+
+@router.get("/{job_id}")
+async def get_job_by_id(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача не найдена"
+        )
+    return job.to_dict()
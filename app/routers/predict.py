@@ -1,30 +1,65 @@
-from fastapi import APIRouter
-from sqlalchemy import extract
-from datetime import datetime
+from fastapi import APIRouter, Request
+from datetime import date, timedelta
 from fastapi import Depends
 from sqlalchemy.orm import Session
 from app.alchemy.db_depends import get_db
 from app.models.predict import Predict
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
 from fastapi import HTTPException, File, UploadFile
-import pandas as pd
-from io import BytesIO
-from decimal import Decimal
 from app.models.predict import Predict
 from app.models.brand import Brand
 from app.models.stack import Stack
 from app.models.warehouse import Warehouse
+from app.infrastructure.validation import validate_frame, validation_report, reject, OnError
+from app.infrastructure.importer import (
+    load_brand_ids, load_stack_ids, upsert_dataframe, error_report,
+    file_fingerprint, find_pending_upload, only_failed_rows, register_uploaded_file, read_upload_frame
+)
+from app.infrastructure.jobs import submit_import, accepted
+from app.infrastructure.responses import FastJSONResponse, table_response
+from app.infrastructure.cache import VersionedCache, data_version
+from typing import BinaryIO, Callable, Optional
+import asyncio
 
 router = APIRouter(prefix="/predict", tags=["predict"])
 
-@router.get("/{year}/{month}")
-async def get_predict(year: int, month: int, db: Annotated[AsyncSession, Depends(get_db)]):    
-    # Get all predictions for given year and month
-    predictions = await db.execute(
+PREDICT_COLUMNS = ['date', 'brand_id', 'stack_id', 'weight']
+PREDICT_KEY = ['stack_id', 'date']
+
+# Годовые тепловые карты по (год, склад); сбрасываются, когда меняются predict или stack
+heatmap_cache = VersionedCache()
+
+
+def month_range(year: int, month: int) -> tuple[date, date]:
+    # Полуинтервал [первое число месяца, первое число следующего): по нему работает индекс на date
+    # конец считаем там же: у декабря 9999 года следующего месяца нет — это тоже 400, а не 500
+    try:
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректная дата")
+    return start, end
+
+
+def day_range(year: int, month: int, day: int) -> tuple[date, date]:
+    try:
+        start = date(year, month, day)
+        end = start + timedelta(days=1)
+    except (ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="Некорректная дата")
+    return start, end
+
+
+def predict_rows():
+    # Только нужные колонки строками, без загрузки ORM-объектов Predict
+    return (
         select(
-            Predict,
+            Predict.id,
+            Predict.date,
+            Predict.weight,
+            Predict.stack_id,
             Stack.name.label('stack_name'),
             Warehouse.name.label('warehouse_name'),
             Brand.name.label('brand_name')
@@ -32,27 +67,92 @@ async def get_predict(year: int, month: int, db: Annotated[AsyncSession, Depends
         .join(Stack, Predict.stack_id == Stack.id)
         .join(Warehouse, Stack.warehouse_id == Warehouse.id)
         .join(Brand, Predict.brand_id == Brand.id)
-        .filter(
-            extract('year', Predict.date) == year,
-            extract('month', Predict.date) == month
-        )
     )
-    
-    # Convert results to list of dictionaries with all needed fields
-    results = []
-    for predict, stack_name, warehouse_name, brand_name in predictions:
-        result = {
-            "id": predict.id,
-            "date": predict.date,
-            "weight": predict.weight,
-            "stack_id": predict.stack_id,
-            "stack_name": stack_name,
-            "warehouse_name": warehouse_name,
-            "brand_name": brand_name
-        }
-        results.append(result)
-    
-    return results
+
+
+@router.get("/calendar/{year}/{month}")
+async def get_predict_calendar(
+    year: int,
+    month: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    stack_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+):
+    # Число предсказанных возгораний и максимальный вес по дням месяца, считается в базе.
+    # Объявлен раньше /{year}/{month}/{day}, иначе "calendar" разбирался бы как год
+    start, end = month_range(year, month)
+    query = (
+        select(Predict.date, func.count().label('count'), func.max(Predict.weight).label('max_weight'))
+        .where(Predict.date >= start, Predict.date < end)
+        .group_by(Predict.date)
+        .order_by(Predict.date)
+    )
+    if stack_id is not None:
+        query = query.where(Predict.stack_id == stack_id)
+    if warehouse_id is not None:
+        query = query.join(Stack, Predict.stack_id == Stack.id).where(Stack.warehouse_id == warehouse_id)
+
+    result = await db.execute(query)
+    return FastJSONResponse([
+        {"date": day, "day": day.day, "count": count, "max_weight": max_weight}
+        for day, count, max_weight in result.all()
+    ])
+
+
+@router.get("/heatmap/{year}")
+async def get_predict_heatmap(
+    year: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    warehouse_id: Optional[int] = None,
+):
+    # Массив на каждый день года: число предсказанных возгораний и доля штабелей
+    # (всего или на складе), для которых оно предсказано
+    version = await data_version(db, 'predict', 'stack')
+    cached = heatmap_cache.get((year, warehouse_id), version)
+    if cached is not None:
+        return FastJSONResponse(cached)
+
+    start, _ = month_range(year, 1)
+    _, end = month_range(year, 12)
+    stacks_total = select(func.count(Stack.id))
+    if warehouse_id is not None:
+        stacks_total = stacks_total.where(Stack.warehouse_id == warehouse_id)
+    query = (
+        select(Predict.date, func.count(), stacks_total.scalar_subquery())
+        .where(Predict.date >= start, Predict.date < end)
+        .group_by(Predict.date)
+    )
+    if warehouse_id is not None:
+        query = query.join(Stack, Predict.stack_id == Stack.id).where(Stack.warehouse_id == warehouse_id)
+
+    days = (end - start).days
+    counts = [0] * days
+    risk = [0.0] * days
+    for day, count, stacks in (await db.execute(query)).all():
+        counts[(day - start).days] = count
+        risk[(day - start).days] = round(count / stacks, 4) if stacks else 0.0
+
+    heatmap = {
+        "year": year,
+        "warehouse_id": warehouse_id,
+        "start": start,
+        "counts": counts,
+        "risk": risk,
+    }
+    heatmap_cache.put((year, warehouse_id), version, heatmap)
+    return FastJSONResponse(heatmap)
+
+
+@router.get("/{year}/{month}")
+async def get_predict(year: int, month: int, request: Request, db: Annotated[AsyncSession, Depends(get_db)]):    
+    # Get all predictions for given year and month
+    start, end = month_range(year, month)
+    query = (
+        predict_rows()
+        .filter(Predict.date >= start, Predict.date < end)
+    )
+    predictions = await db.execute(query)
+    return table_response(request, [dict(row) for row in predictions.mappings()], query.selected_columns)
 
 
 @router.get("/stack/{stack_id}/{year}/{month}")
@@ -60,95 +160,61 @@ async def get_predict_by_stack_and_month(
     stack_id: int, 
     year: int, 
     month: int, 
+    request: Request,
     db: Annotated[AsyncSession, Depends(get_db)]
 ):
     # Get predictions for specific stack in given year and month
-    predictions = await db.execute(
-        select(
-            Predict,
-            Stack.name.label('stack_name'),
-            Warehouse.name.label('warehouse_name'),
-            Brand.name.label('brand_name')
-        )
-        .join(Stack, Predict.stack_id == Stack.id)
-        .join(Warehouse, Stack.warehouse_id == Warehouse.id)
-        .join(Brand, Predict.brand_id == Brand.id)
+    start, end = month_range(year, month)
+    query = (
+        predict_rows()
         .filter(
             Predict.stack_id == stack_id,
-            extract('year', Predict.date) == year,
-            extract('month', Predict.date) == month
+            Predict.date >= start,
+            Predict.date < end
         )
     )
-
-    # Convert results to list of dictionaries
-    results = []
-    for predict, stack_name, warehouse_name, brand_name in predictions:
-        result = {
-            "id": predict.id,
-            "date": predict.date,
-            "weight": predict.weight,
-            "stack_id": predict.stack_id,
-            "stack_name": stack_name,
-            "warehouse_name": warehouse_name,
-            "brand_name": brand_name
-        }
-        results.append(result)
-
-    return results
+    predictions = await db.execute(query)
+    return table_response(request, [dict(row) for row in predictions.mappings()], query.selected_columns)
 
 
 @router.get("/{year}/{month}/{day}")
-async def get_predict_by_date(year: int, month: int, day: int, db: Annotated[AsyncSession, Depends(get_db)]):    
+async def get_predict_by_date(year: int, month: int, day: int, request: Request, db: Annotated[AsyncSession, Depends(get_db)]):    
     # Get all predictions for given year, month and day with related stack, warehouse and brand info
-    predictions = await db.execute(
-        select(
-            Predict,
-            Stack.name.label('stack_name'),
-            Warehouse.name.label('warehouse_name'),
-            Brand.name.label('brand_name')
-        )
-        .join(Stack, Predict.stack_id == Stack.id)
-        .join(Warehouse, Stack.warehouse_id == Warehouse.id)
-        .join(Brand, Predict.brand_id == Brand.id)
-        .filter(
-            extract('year', Predict.date) == year,
-            extract('month', Predict.date) == month,
-            extract('day', Predict.date) == day
-        )
+    start, end = day_range(year, month, day)
+    query = (
+        predict_rows()
+        .filter(Predict.date >= start, Predict.date < end)
     )
-    
-    # Convert results to list of dictionaries with all needed fields
-    results = []
-    for predict, stack_name, warehouse_name, brand_name in predictions:
-        result = {
-            "id": predict.id,
-            "date": predict.date,
-            "weight": predict.weight,
-            "stack_id": predict.stack_id,
-            "stack_name": stack_name,
-            "warehouse_name": warehouse_name,
-            "brand_name": brand_name
-        }
-        results.append(result)
-    
-    return results
+    predictions = await db.execute(query)
+    return table_response(request, [dict(row) for row in predictions.mappings()], query.selected_columns)
 
 
 @router.get("/{stack_id}")
-async def get_predict_by_stack_id(stack_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
-    predictions = await db.execute(select(Predict).filter(
+async def get_predict_by_stack_id(stack_id: int, request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
+    query = select(*Predict.__table__.columns).filter(
         Predict.stack_id == stack_id
-    ))
-    predictions = predictions.scalars().all()
-    return predictions
+    )
+    predictions = await db.execute(query)
+    return table_response(request, [dict(row) for row in predictions.mappings()], query.selected_columns)
 
-@router.post("/upload-csv")
-async def upload_csv(db : Annotated[AsyncSession, Depends(get_db)], file: UploadFile = File(...)):
-    try:
-        content = await file.read()
-        df = pd.read_csv(BytesIO(content))
-    except pd.errors.ParserError as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка разбора CSV: {e}")
+async def import_predicts(
+    db: AsyncSession,
+    source: BinaryIO,
+    filename: Optional[str] = None,
+    force: bool = False,
+    dry_run: bool = False,
+    on_error: OnError = 'skip',
+    progress: Optional[Callable[[int], None]] = None,
+) -> dict:
+    # 0) Тот же файл уже загружали — ничего не делаем, а если загрузили
+    # не целиком — догружаем только строки, не прошедшие тогда проверку
+    sha256 = await file_fingerprint(source)
+    duplicate, retry_rows = await find_pending_upload(db, 'predict', sha256, force, dry_run)
+    if duplicate:
+        return duplicate
+
+    # 1) Прочитать файл (CSV, Parquet или Arrow IPC) в pandas
+    df = await asyncio.to_thread(read_upload_frame, source, filename, {'Склад': str, 'Штабель': str})
     
     # 2) Переименовать колонки под удобные имена
     df = df.rename(columns={
@@ -158,6 +224,8 @@ async def upload_csv(db : Annotated[AsyncSession, Depends(get_db)], file: Upload
         'Склад':            'warehouse_name',
         'Штабель':          'stack_number' # нужен id штабеля
     })
+    rows = len(df)
+    df = only_failed_rows(df, retry_rows)
 
     # 3) Проверить наличие всех необходимых колонок
     required_columns = ['date', 'brand_name', 'weight', 'warehouse_name', 'stack_number']
@@ -165,50 +233,40 @@ async def upload_csv(db : Annotated[AsyncSession, Depends(get_db)], file: Upload
     if missing_columns:
         raise HTTPException(status_code=400, detail=f"Отсутствуют необходимые колонки: {missing_columns}")  
     
-    # 4) Преобразовать даты и числовые поля
-    df['date'] = pd.to_datetime(df['date']).dt.date
-    df['weight'] = df['weight'].astype(float).apply(Decimal)
-
-    # 5) Для каждой строки находим brand_id и stack_id и создаём объект Predict
-    predicts_to_add = []
-    for row in df.itertuples(index=False):
-        q_brand = await db.execute(
-            select(Brand.id).where(Brand.name == str(row.brand_name))
-        )
-        brand_id = q_brand.scalar_one_or_none()
-        if brand_id is None:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Не найдена марка '{row.brand_name}'"
-            )
-
-        # Найдём штабель по имени
-        stmt = (
-            select(Stack.id)
-            .join(Stack.warehouse)  # JOIN warehouse ON stack.warehouse_id = warehouse.id
-            .where(
-                Stack.name == str(row.stack_number),
-                Warehouse.name == str(row.warehouse_name)
-            )
-        )
-        q_stack = await db.execute(stmt)
-
-        stack_id = q_stack.scalar_one_or_none()
-        if stack_id is None:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Не найден штабель '{row.stack_number, row.warehouse_name}'"
-            )
-        predict = Predict(
-            date=row.date,
-            brand_id=brand_id,
-            stack_id=stack_id,
-            weight=row.weight
-        )
-        predicts_to_add.append(predict)
-    
-    # 6) Сохраняем все записи пачкой
-    db.add_all(predicts_to_add)
+    # 4) Проверяем весь файл разом: даты, веса, марки и штабели по словарям,
+    # загруженным одним запросом на таблицу, повторы ключа
+    brand_ids = await load_brand_ids(db)
+    stack_ids = await load_stack_ids(db)
+    df, errors = validate_frame(
+        df, brand_ids, stack_ids, PREDICT_KEY,
+        dates={'date': True},
+        numbers={'weight': False},
+    )
+    if dry_run:
+        return validation_report(rows, len(df), errors)
+    if errors and on_error == 'abort':
+        reject(errors)
+
+    # 6) Сохраняем все записи через COPY + upsert по (stack_id, date)
+    inserted, updated = await upsert_dataframe(db, Predict.__table__, df, PREDICT_COLUMNS, PREDICT_KEY)
+    await register_uploaded_file(db, 'predict', sha256, filename, rows, {e['row'] for e in errors})
     await db.commit()
+    if progress:
+        progress(rows)
 
-    return {"status": "ok", "inserted": len(predicts_to_add)}
+    return error_report(inserted, errors, updated=updated)
+
+
+@router.post("/upload-csv")
+async def upload_csv(
+    db : Annotated[AsyncSession, Depends(get_db)],
+    file: UploadFile = File(...),
+    background: bool = False,
+    force: bool = False,
+    dry_run: bool = False,
+    on_error: OnError = 'skip'
+):
+    options = dict(filename=file.filename, force=force, dry_run=dry_run, on_error=on_error)
+    if background:
+        return accepted(await submit_import('predict', file, import_predicts, **options))
+    return await import_predicts(db, file.file, **options)
@@ -1,21 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update, delete
+from sqlalchemy import select, insert, update, delete, func, bindparam, literal_column, String, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from app.alchemy.db_depends import get_db
 from app.models.stack import Stack
 from app.schemas.stack import CreateStack, UpdateStack
 from typing import Annotated
 import csv
-from sqlalchemy.exc import IntegrityError
+import asyncio
+from typing import BinaryIO, Callable, Optional
+from app.infrastructure.jobs import submit_import, submit_task, accepted
+from app.infrastructure.purge import purge_stacks
+from app.infrastructure.responses import FastJSONResponse, table_response, response_format
+from app.infrastructure.cache import table_etag, etag_headers, not_modified, reference_cache
+from app.infrastructure.importer import load_warehouse_ids
+from app.infrastructure.pagination import keyset_page, page_response, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.infrastructure.lookup import parse_ids, id_in
 from app.models.warehouse import Warehouse
+from app.models.temperature import Temperature
+from app.models.supplies import Supplies
+from app.models.stack_inventory import StackInventory
+from app.models.current_predict import CurrentPredict
+from app.alchemy.db import async_session_maker
+from datetime import date
 from sqlalchemy.orm import selectinload
 
 router = APIRouter(prefix="/stack", tags=["stack"])
 
 @router.post("/")
 async def create_stack(db: Annotated[AsyncSession, Depends(get_db)], create_stack: CreateStack):
-    warehouse = await db.execute(select(Warehouse.id).where(Warehouse.name == create_stack.warehouse))
-    warehouse_id = warehouse.scalar_one_or_none()
+    warehouse_id = (await load_warehouse_ids(db)).get(create_stack.warehouse)
     if not warehouse_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -26,24 +40,96 @@ async def create_stack(db: Annotated[AsyncSession, Depends(get_db)], create_stac
         warehouse_id=warehouse_id
     ))
     await db.commit()
+    reference_cache.invalidate('stack')
     return {
         'status_code': status.HTTP_201_CREATED,
         'transaction': 'Successful'
     }
 
 @router.get("/")
-async def get_all_stacks(db: Annotated[AsyncSession, Depends(get_db)]):
-    result = await db.execute(select(Stack).options(selectinload(Stack.warehouse)))
-    stacks = result.scalars().all()
-    return [
-        {
-            "id": s.id,
-            "name": s.name,
-            "warehouse_id": s.warehouse_id,
-            "warehouse_name": s.warehouse.name if s.warehouse else None
-        }
-        for s in stacks
-    ]
+async def get_all_stacks(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    q: Optional[str] = None,
+    warehouse_id: Optional[int] = None,
+    id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    # В ответе есть название склада, поэтому версия зависит и от warehouse;
+    # фильтры и курсор входят в URL, а по нему клиент и так различает ответы
+    etag = await table_etag(db, 'stack', 'warehouse', variant=response_format(request))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    # Поиск по подстроке названия обслуживается триграммным индексом ix_stack_name_trgm
+    query = (
+        select(Stack.id, Stack.name, Stack.warehouse_id, Warehouse.name.label('warehouse_name'))
+        .outerjoin(Warehouse, Stack.warehouse_id == Warehouse.id)
+    )
+    if q:
+        query = query.where(Stack.name.icontains(q, autoescape=True))
+    if warehouse_id is not None:
+        query = query.where(Stack.warehouse_id == warehouse_id)
+    if id is not None:
+        query = query.where(Stack.id == id)
+
+    result = await db.execute(keyset_page(query, Stack.id, limit, cursor))
+    stacks = [dict(row) for row in result.mappings()]
+    page = page_response(stacks, limit)
+    return table_response(request, page['items'], query.selected_columns, headers=etag_headers(etag), next_cursor=page['next_cursor'])
+
+def _inventory_query():
+    # штабель без поставок ещё не попал в stack_inventory — у него нулевой остаток
+    return (
+        select(
+            Stack.id,
+            Stack.name,
+            Stack.warehouse_id,
+            func.coalesce(StackInventory.current_weight, 0).label('current_weight'),
+            func.coalesce(StackInventory.added_weight, 0).label('added_weight'),
+            func.coalesce(StackInventory.removed_weight, 0).label('removed_weight'),
+            StackInventory.updated_at,
+        )
+        .outerjoin(StackInventory, StackInventory.stack_id == Stack.id)
+    )
+
+
+@router.get("/inventory")
+async def get_stacks_inventory(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    warehouse_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    # Остатки читаются из stack_inventory, поставки не пересчитываются
+    query = _inventory_query()
+    if warehouse_id is not None:
+        query = query.where(Stack.warehouse_id == warehouse_id)
+    result = await db.execute(keyset_page(query, Stack.id, limit, cursor))
+    page = page_response([dict(row) for row in result.mappings()], limit)
+    return table_response(request, page['items'], query.selected_columns, next_cursor=page['next_cursor'])
+
+
+@router.get("/batch")
+async def get_stacks_batch(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    ids: list[str] = Query(...),
+):
+    # Несколько штабелей одним запросом вместо GET /stack/{id} на каждый;
+    # ненайденных id в ответе просто нет
+    query = (
+        select(Stack.id, Stack.name, Stack.warehouse_id, Warehouse.name.label('warehouse_name'))
+        .outerjoin(Warehouse, Stack.warehouse_id == Warehouse.id)
+        .where(id_in(Stack.id, parse_ids(ids)))
+        .order_by(Stack.id)
+    )
+    result = await db.execute(query)
+    stacks = [dict(row) for row in result.mappings()]
+    return table_response(request, stacks, query.selected_columns)
 
 @router.get("/{stack_id}")
 async def get_stack_by_id(stack_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
@@ -63,60 +149,161 @@ async def get_stack_by_id(stack_id: int, db: Annotated[AsyncSession, Depends(get
     }
 
 
+@router.get("/{stack_id}/inventory")
+async def get_stack_inventory(stack_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
+    result = await db.execute(_inventory_query().where(Stack.id == stack_id))
+    inventory = result.mappings().first()
+    if not inventory:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Штабель не найден")
+    return FastJSONResponse(dict(inventory))
+
+
+async def _fetch_rows(query) -> list[dict]:
+    # у каждого параллельного запроса своя сессия: одна AsyncSession не выполняет запросы одновременно
+    async with async_session_maker() as session:
+        result = await session.execute(query)
+        return [dict(row) for row in result.mappings()]
+
+
+@router.get("/{stack_id}/overview")
+async def get_stack_overview(
+    stack_id: int,
+    temperature_limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    predict_limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Всё для страницы штабеля за один запрос: независимые выборки идут параллельно."""
+    stack_query = (
+        select(Stack.id, Stack.name, Stack.warehouse_id, Warehouse.name.label('warehouse_name'))
+        .outerjoin(Warehouse, Stack.warehouse_id == Warehouse.id)
+        .where(Stack.id == stack_id)
+    )
+    temperature_query = (
+        select(Temperature.act_date, Temperature.shift, Temperature.picket, Temperature.max_temperature)
+        .where(Temperature.stack_id == stack_id)
+        .order_by(Temperature.act_date.desc(), Temperature.shift.desc().nulls_last(), Temperature.id.desc())
+        .limit(temperature_limit)
+    )
+    # текущий вес — готовый остаток из stack_inventory,
+    # дата формирования — первая выгрузка (как в признаках модели)
+    supplies_query = (
+        select(
+            func.coalesce(
+                select(StackInventory.current_weight).where(StackInventory.stack_id == stack_id).scalar_subquery(), 0
+            ).label('current_weight'),
+            # NaN > 0 для numeric истинно — такие веса старых загрузок не считаем выгрузкой
+            func.min(Supplies.warehouse_date)
+            .filter(Supplies.warehouse_weight > 0, Supplies.warehouse_weight != literal_column("'NaN'"))
+            .label('formation_date'),
+        )
+        .where(Supplies.stack_id == stack_id)
+    )
+    predict_query = (
+        select(CurrentPredict.id, CurrentPredict.date, CurrentPredict.weight, CurrentPredict.brand_id)
+        .where(CurrentPredict.stack_id == stack_id, CurrentPredict.date >= date.today())
+        .order_by(CurrentPredict.date)
+        .limit(predict_limit)
+    )
+
+    stacks, temperatures, supplies, predicts = await asyncio.gather(
+        _fetch_rows(stack_query),
+        _fetch_rows(temperature_query),
+        _fetch_rows(supplies_query),
+        _fetch_rows(predict_query),
+    )
+    if not stacks:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Штабель не найден")
+    # DECIMAL отдаём числом, NaN в температурах старых загрузок — null
+    return FastJSONResponse({
+        **stacks[0],
+        **supplies[0],
+        'temperatures': temperatures,
+        'upcoming_predicts': predicts,
+    })
+
+
 @router.put("/{stack_id}")
 async def update_stack(stack_id: int, db: Annotated[AsyncSession, Depends(get_db)], update_stack: UpdateStack):
     stack = await db.execute(select(Stack).where(Stack.id == stack_id))
     await db.execute(update(Stack).where(Stack.id == stack_id).values(**update_stack.dict()))
     await db.commit()
+    reference_cache.invalidate('stack')
     return {
         'status_code': status.HTTP_200_OK,
         'transaction': 'Successful'
     }
 
 @router.delete("/{stack_id}")
-async def delete_stack(stack_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
-    await db.execute(delete(Stack).where(Stack.id == stack_id))
-    await db.commit()
+async def delete_stack(stack_id: int, db: Annotated[AsyncSession, Depends(get_db)], background: bool = False):
+    # Поставки, температуры и прогнозы удаляются пачками в отдельных транзакциях, а не одним
+    # каскадом; для штабеля с большой историей background=true делает то же в фоне,
+    # статус — в /jobs/{job_id}
+    if background:
+        return accepted(submit_task('stack_purge', purge_stacks, stack_ids=[stack_id]))
+    result = await purge_stacks(db, [stack_id])
     return {
         'status_code': status.HTTP_200_OK,
-        'transaction': 'Successful'
+        'transaction': 'Successful',
+        **result
+    }
+
+async def import_stacks(db: AsyncSession, source: BinaryIO, progress: Optional[Callable[[int], None]] = None) -> dict:
+    content = await asyncio.to_thread(source.read)
+    # Декодируем байты в строку
+    text = content.decode('utf-8')
+    # Читаем CSV
+    reader = csv.DictReader(text.splitlines())
+    stacks_data = list(reader)
+    
+    # Получаем маппинг складов
+    warehouses = await load_warehouse_ids(db)
+
+    names, warehouse_ids = [], []
+    unknown_warehouse = 0
+    for row in stacks_data:
+        warehouse_id = warehouses.get(str(row['warehouse_name']))
+        if not warehouse_id:
+            unknown_warehouse += 1
+            continue
+        names.append(row['stack'])
+        warehouse_ids.append(warehouse_id)
+
+    # Вставляем весь файл одним INSERT ... SELECT unnest(...) ON CONFLICT DO NOTHING:
+    # уже существующие штабели (и повторы внутри файла) просто пропускаются
+    result = await db.execute(
+        pg_insert(Stack)
+        .from_select(
+            ['name', 'warehouse_id'],
+            select(
+                func.unnest(bindparam('names', names, type_=ARRAY(String))),
+                func.unnest(bindparam('warehouse_ids', warehouse_ids, type_=ARRAY(Integer))),
+            )
+        )
+        .on_conflict_do_nothing(constraint='uix_stack_warehouse_name')
+        .returning(Stack.id)
+    )
+    inserted = len(result.all())
+    await db.commit()
+    reference_cache.invalidate('stack')
+    if progress:
+        progress(len(stacks_data))
+
+    return {
+        'status_code': status.HTTP_201_CREATED,
+        'transaction': 'Successful',
+        'inserted': inserted,
+        'skipped': len(names) - inserted,
+        'unknown_warehouse': unknown_warehouse
     }
 
+
 @router.post("/upload")
-async def upload_stacks(db: Annotated[AsyncSession, Depends(get_db)], file: UploadFile):
+async def upload_stacks(db: Annotated[AsyncSession, Depends(get_db)], file: UploadFile, background: bool = False):
+    if background:
+        return accepted(await submit_import('stack', file, import_stacks))
     try:
-        content = await file.read()
-        # Декодируем байты в строку
-        text = content.decode('utf-8')
-        # Читаем CSV
-        reader = csv.DictReader(text.splitlines())
-        stacks_data = list(reader)
-        
-        # Получаем маппинг складов
-        warehouses_result = await db.execute(select(Warehouse))
-        warehouses = {w.name: w.id for w in warehouses_result.scalars().all()}
-        
-        for row in stacks_data:
-            warehouse_id = warehouses.get(str(row['warehouse_name']))
-            if not warehouse_id:
-                continue
-            try:
-                stack_data = {
-                    'name': row['stack'],
-                    'warehouse_id': warehouse_id
-                }
-                await db.execute(insert(Stack).values(**stack_data))
-                await db.commit()
-            except IntegrityError:
-                await db.rollback()
-                continue
-        return {
-            'status_code': status.HTTP_201_CREATED,
-            'transaction': 'Successful'
-        }
+        return await import_stacks(db, file.file)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
-
@@ -1,44 +1,70 @@
-from fastapi import APIRouter, Depends, status, HTTPException, File, UploadFile
+from fastapi import APIRouter, Depends, status, HTTPException, File, UploadFile, Query, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import insert, select, update, delete
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from decimal import Decimal
+from datetime import date
+from typing import BinaryIO, Callable, Optional
+import asyncio
 
 from app.alchemy.db_depends import get_db
-from app.models.supplies import Supplies, SuppliesOut
-from app.models.brand import Brand
-from app.models.stack import Stack
-from app.models.warehouse import Warehouse
-from app.schemas.supplies import CreateSupplies, UpdateSupplies
-import pandas as pd
-from io import BytesIO
+from app.models.supplies import Supplies
+from app.schemas.supplies import CreateSupplies, UpdateSupplies, CreateSuppliesBatch, UpdateSuppliesBatch, DeleteSuppliesBatch
+from app.infrastructure.validation import validate_frame, validation_report, reject, OnError
+from app.infrastructure.importer import (
+    load_brand_ids, load_stack_ids, copy_dataframe, error_report,
+    file_fingerprint, find_pending_upload, only_failed_rows, register_uploaded_file, read_upload_frame
+)
+from app.infrastructure.jobs import submit_import, accepted
+from app.infrastructure.batch import batch_insert, batch_update, batch_delete, batch_report, execute_or_conflict
+from app.infrastructure.responses import table_response
+from app.infrastructure.pagination import keyset_page, page_response, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(prefix="/supplies", tags=["supplies"])
 
-def sanitize_supplies(supplies_list):
-    for s in supplies_list:
-        if isinstance(s.ship_weight, Decimal) and (s.ship_weight.is_nan() or s.ship_weight.is_infinite()):
-            s.ship_weight = None
-        if isinstance(s.warehouse_weight, Decimal) and (s.warehouse_weight.is_nan() or s.warehouse_weight.is_infinite()):
-            s.warehouse_weight = None
-    return supplies_list
+SUPPLIES_COLUMNS = ['brand_id', 'stack_id', 'warehouse_date', 'warehouse_weight', 'ship_date', 'ship_weight']
+# У поставки нет естественного ключа: выгрузок одной марки на штабель за день бывает
+# несколько, в том числе одинаковых. Повторную загрузку отсекает отпечаток файла.
+SUPPLIES_KEY = []
 
 @router.post("/")
 async def create_supplies(db: Annotated[AsyncSession, Depends(get_db)], create_supplies: CreateSupplies):
-    await db.execute(insert(Supplies).values(**create_supplies.dict()))
+    # повтор по уникальному ключу или ссылка на несуществующую запись — 409, а не 500
+    await execute_or_conflict(db, insert(Supplies).values(**create_supplies.dict()))
     await db.commit()
     return {
         'status_code': status.HTTP_201_CREATED,
         'transaction': 'Successful'
     }
 
-@router.get("/", response_model=list[SuppliesOut])
-async def get_all_supplies(db: Annotated[AsyncSession, Depends(get_db)]):
-    result = await db.execute(select(Supplies).limit(1000))
-    supplies = result.scalars().all()
-    return sanitize_supplies(supplies)
+@router.get("/")
+async def get_all_supplies(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stack_id: Optional[int] = None,
+    brand_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    # Фильтры по штабелю, марке и дате выгрузки на склад (обе границы включительно)
+    query = select(*Supplies.__table__.columns)
+    if stack_id is not None:
+        query = query.where(Supplies.stack_id == stack_id)
+    if brand_id is not None:
+        query = query.where(Supplies.brand_id == brand_id)
+    if date_from is not None:
+        query = query.where(Supplies.warehouse_date >= date_from)
+    if date_to is not None:
+        query = query.where(Supplies.warehouse_date <= date_to)
+
+    # Колонки строками, без ORM-объектов; NaN в весах сериализатор отдаёт как null
+    result = await db.execute(keyset_page(query, Supplies.id, limit, cursor))
+    supplies = [dict(row) for row in result.mappings()]
+    page = page_response(supplies, limit)
+    return table_response(request, page['items'], query.selected_columns, next_cursor=page['next_cursor'])
 
 @router.get("/{supplies_id}")
 async def get_supplies_by_id(supplies_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
@@ -48,7 +74,7 @@ async def get_supplies_by_id(supplies_id: int, db: Annotated[AsyncSession, Depen
 
 @router.put("/update/{supplies_id}")
 async def update_supplies(supplies_id: int, db: Annotated[AsyncSession, Depends(get_db)], update_supplies: UpdateSupplies):
-    await db.execute(update(Supplies).where(Supplies.id == supplies_id).values(**{k: v for k, v in update_supplies.dict().items() if v is not None}))
+    await execute_or_conflict(db, update(Supplies).where(Supplies.id == supplies_id).values(**{k: v for k, v in update_supplies.dict().items() if v is not None}))
     await db.commit()
     return {
         'status_code': status.HTTP_200_OK,
@@ -64,17 +90,47 @@ async def delete_supplies(supplies_id: int, db: Annotated[AsyncSession, Depends(
         'transaction': 'Successful'
     }
 
-@router.post("/upload-csv")
-async def upload_csv(
-    db: Annotated[AsyncSession, Depends(get_db)],
-    file: UploadFile = File(...)
-):
-    try:
-        # 1) Прочитать CSV в pandas
-        content = await file.read()
-        df = pd.read_csv(BytesIO(content))
-    except pd.errors.ParserError as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка разбора CSV: {e}")
+# Пакетные операции: одна операция — один SQL-оператор, весь пакет — одна транзакция
+
+@router.post("/batch/create")
+async def create_supplies_batch(db: Annotated[AsyncSession, Depends(get_db)], batch: CreateSuppliesBatch):
+    results = await batch_insert(db, Supplies.__table__, [item.model_dump() for item in batch.items], SUPPLIES_KEY)
+    await db.commit()
+    return batch_report(results, status.HTTP_201_CREATED)
+
+@router.put("/batch/update")
+async def update_supplies_batch(db: Annotated[AsyncSession, Depends(get_db)], batch: UpdateSuppliesBatch):
+    results = await batch_update(db, Supplies.__table__, [item.model_dump(exclude_unset=True) for item in batch.items])
+    await db.commit()
+    return batch_report(results)
+
+@router.post("/batch/delete")
+async def delete_supplies_batch(db: Annotated[AsyncSession, Depends(get_db)], batch: DeleteSuppliesBatch):
+    results = await batch_delete(
+        db, Supplies.__table__, Supplies.warehouse_date,
+        ids=batch.ids, stack_id=batch.stack_id, date_from=batch.date_from, date_to=batch.date_to,
+    )
+    await db.commit()
+    return batch_report(results)
+
+async def import_supplies(
+    db: AsyncSession,
+    source: BinaryIO,
+    filename: Optional[str] = None,
+    force: bool = False,
+    dry_run: bool = False,
+    on_error: OnError = 'skip',
+    progress: Optional[Callable[[int], None]] = None,
+) -> dict:
+    # 0) Тот же файл уже загружали — ничего не делаем, а если загрузили
+    # не целиком — догружаем только строки, не прошедшие тогда проверку
+    sha256 = await file_fingerprint(source)
+    duplicate, retry_rows = await find_pending_upload(db, 'supplies', sha256, force, dry_run)
+    if duplicate:
+        return duplicate
+
+    # 1) Прочитать файл (CSV, Parquet или Arrow IPC) в pandas
+    df = await asyncio.to_thread(read_upload_frame, source, filename, {'Склад': str, 'Штабель': str})
     
     # 2) Переименовать колонки под удобные имена
     df = df.rename(columns={
@@ -86,6 +142,8 @@ async def upload_csv(
         'На судно, тн':    'ship_weight',
         'Склад':           'warehouse_name'
     })
+    rows = len(df)
+    df = only_failed_rows(df, retry_rows)
 
     # 3) Проверить, что все колонки присутствуют
     required_columns = ['warehouse_date', 'warehouse_name', 'stack_number', 'brand_name', 'warehouse_weight', 'ship_date', 'ship_weight']
@@ -93,62 +151,44 @@ async def upload_csv(
     if missing_columns:
         raise HTTPException(status_code=400, detail=f"Отсутствуют обязательные колонки: {missing_columns}")
 
-    # 3) Преобразовать даты и числовые поля
-    df['warehouse_date'] = pd.to_datetime(df['warehouse_date'], format='%Y-%m-%d', ).dt.date
-    df['ship_date'] = pd.to_datetime(df['ship_date'], format='%Y-%m-%d', ).dt.date
-
-    df['warehouse_weight'] = df['warehouse_weight'].astype(float).apply(Decimal)
-    df['ship_weight']      = df['ship_weight'].astype(float).apply(Decimal)
-
-
-    # 4) Для каждой строки находим brand_id и stack_id и создаём объект Supplies
-    supplies_to_add = []
-    for row in df.itertuples(index=False):
-        q_brand = await db.execute(
-            select(Brand.id).where(Brand.name == str(row.brand_name))
-        )
-        brand_id = q_brand.scalar_one_or_none()
-        if brand_id is None:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Не найдена марка '{row.brand_name}'"
-            )
-
-        # Найдём штабель по имени
-        stmt = (
-            select(Stack.id)
-            .join(Stack.warehouse)  # JOIN warehouse ON stack.warehouse_id = warehouse.id
-            .where(
-                Stack.name == str(row.stack_number),
-                Warehouse.name == str(row.warehouse_name)
-            )
-        )
-        q_stack = await db.execute(stmt)
-
-        stack_id = q_stack.scalar_one_or_none()
-        if stack_id is None:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Не найден штабель '{row.stack_number, row.warehouse_name}'"
-            )
-
-        supplies = Supplies(
-            brand_id=brand_id,
-            stack_id=stack_id,
-            warehouse_date=row.warehouse_date,
-            warehouse_weight=row.warehouse_weight,
-            ship_date=row.ship_date,
-            ship_weight=row.ship_weight,
-        )
-        supplies_to_add.append(supplies)
-
-    # 5) Сохраняем все записи пачкой
-    db.add_all(supplies_to_add)
+    # 4) Проверяем весь файл разом: даты, веса, марки и штабели по словарям,
+    # загруженным одним запросом на таблицу
+    brand_ids = await load_brand_ids(db)
+    stack_ids = await load_stack_ids(db)
+    df, errors = validate_frame(
+        df, brand_ids, stack_ids, SUPPLIES_KEY,
+        dates={'warehouse_date': True, 'ship_date': False},
+        numbers={'warehouse_weight': True, 'ship_weight': False},
+        date_format='%Y-%m-%d',
+    )
+    if dry_run:
+        return validation_report(rows, len(df), errors)
+    if errors and on_error == 'abort':
+        reject(errors)
+
+    # 5) Сохраняем корректные строки одним COPY, ошибочные попадают в отчёт
+    # и запоминаются для повторной загрузки того же файла
+    inserted = await copy_dataframe(db, 'supplies', df, SUPPLIES_COLUMNS)
+    await register_uploaded_file(db, 'supplies', sha256, filename, rows, {e['row'] for e in errors})
     await db.commit()
+    if progress:
+        progress(rows)
 
-    return {"status": "ok", "inserted": len(supplies_to_add)}
-
-
-        
+    return error_report(inserted, errors)
 
 
+@router.post("/upload-csv")
+async def upload_csv(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    file: UploadFile = File(...),
+    background: bool = False,
+    force: bool = False,
+    dry_run: bool = False,
+    on_error: OnError = 'skip'
+):
+    # dry_run — только проверить файл и вернуть полную таблицу ошибок;
+    # on_error=abort — при любой ошибке ничего не загружать
+    options = dict(filename=file.filename, force=force, dry_run=dry_run, on_error=on_error)
+    if background:
+        return accepted(await submit_import('supplies', file, import_supplies, **options))
+    return await import_supplies(db, file.file, **options)
@@ -1,25 +1,44 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, status
 from sqlalchemy.orm import Session
-from sqlalchemy import insert, select, update, delete
+from sqlalchemy import insert, select, update, delete, func, literal_column
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
 import pandas as pd
-from io import BytesIO
-from fastapi import HTTPException, UploadFile, File
-from decimal import Decimal
+from fastapi import HTTPException, UploadFile, File, Query
+from datetime import date
+import asyncio
+from typing import BinaryIO, Callable, Optional
 from app.alchemy.db_depends import get_db
 from app.models.temperature import Temperature
-from app.schemas.temperature import CreateTemperature, UpdateTemperature
-from app.models.brand import Brand
-from app.models.stack import Stack
-from app.models.warehouse import Warehouse
+from app.schemas.temperature import CreateTemperature, UpdateTemperature, CreateTemperatureBatch, UpdateTemperatureBatch, DeleteTemperatureBatch
+from app.infrastructure.validation import validate_frame, validation_report, reject, count_failed, OnError
+from app.infrastructure.importer import (
+    load_brand_ids, load_stack_ids, upsert_dataframe, error_report, MAX_REPORTED_ERRORS,
+    file_fingerprint, find_pending_upload, only_failed_rows, register_uploaded_file,
+    read_upload_frame, iter_upload_frames
+)
+from app.infrastructure.jobs import submit_import, accepted
+from app.infrastructure.batch import batch_insert, batch_update, batch_delete, batch_report, execute_or_conflict
+from app.infrastructure.responses import table_response
+from app.infrastructure.pagination import keyset_page, page_response, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.infrastructure.downsampling import lttb_indices
 import numpy as np
 
 router = APIRouter(prefix="/temperature", tags=["temperature"])
 
+TEMPERATURE_COLUMNS = ['brand_id', 'stack_id', 'max_temperature', 'picket', 'act_date', 'shift']
+TEMPERATURE_KEY = ['stack_id', 'act_date', 'shift', 'picket']
+TEMPERATURE_DTYPES = {'Склад': str, 'Штабель': str, 'Пикет': str}
+# Строк в одном куске при потоковой загрузке
+STREAM_CHUNK_SIZE = 50_000
+# Точек во временном ряду по умолчанию и максимум; длинные ряды прореживаются LTTB
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 5_000
+
 @router.post("/")
 async def create_temperature(db: Annotated[AsyncSession, Depends(get_db)], create_temperature: CreateTemperature):
-    await db.execute(insert(Temperature).values(**create_temperature.dict()))
+    # повтор по уникальному ключу или ссылка на несуществующую запись — 409, а не 500
+    await execute_or_conflict(db, insert(Temperature).values(**create_temperature.dict()))
     await db.commit()
     return {
         'status_code': status.HTTP_201_CREATED,
@@ -27,10 +46,75 @@ async def create_temperature(db: Annotated[AsyncSession, Depends(get_db)], creat
     }
 
 @router.get("/")
-async def get_all_temperatures(db: Annotated[AsyncSession, Depends(get_db)]):
-    result = await db.execute(select(Temperature).limit(1000))
-    temperatures = result.scalars().all()
-    return temperatures
+async def get_all_temperatures(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stack_id: Optional[int] = None,
+    brand_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    # Фильтры по штабелю, марке и дате акта (обе границы включительно)
+    query = select(*Temperature.__table__.columns)
+    if stack_id is not None:
+        query = query.where(Temperature.stack_id == stack_id)
+    if brand_id is not None:
+        query = query.where(Temperature.brand_id == brand_id)
+    if date_from is not None:
+        query = query.where(Temperature.act_date >= date_from)
+    if date_to is not None:
+        query = query.where(Temperature.act_date <= date_to)
+
+    result = await db.execute(keyset_page(query, Temperature.id, limit, cursor))
+    temperatures = [dict(row) for row in result.mappings()]
+    page = page_response(temperatures, limit)
+    return table_response(request, page['items'], query.selected_columns, next_cursor=page['next_cursor'])
+
+@router.get("/stack/{stack_id}/series")
+async def get_temperature_series(
+    stack_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    points: int = Query(DEFAULT_SERIES_POINTS, ge=3, le=MAX_SERIES_POINTS),
+):
+    # Максимум по пикетам за каждую дату и смену; выборку по штабелю и дате
+    # обслуживает уникальный индекс uix_temperature_natural_key (stack_id, act_date, ...).
+    # NaN старых загрузок отбрасываем: для numeric он больше любого числа и выиграл бы max()
+    query = (
+        select(Temperature.act_date, Temperature.shift, func.max(Temperature.max_temperature).label('max_temperature'))
+        .where(
+            Temperature.stack_id == stack_id,
+            Temperature.max_temperature.is_not(None),
+            Temperature.max_temperature != literal_column("'NaN'"),
+        )
+        .group_by(Temperature.act_date, Temperature.shift)
+        .order_by(Temperature.act_date, Temperature.shift.nulls_first())
+    )
+    if date_from is not None:
+        query = query.where(Temperature.act_date >= date_from)
+    if date_to is not None:
+        query = query.where(Temperature.act_date <= date_to)
+    rows = (await db.execute(query)).all()
+
+    source_points = len(rows)
+    if source_points > points:
+        # ось x — дата плюс доля суток по смене, чтобы смены одного дня не совпадали
+        x = np.array([row.act_date.toordinal() + (row.shift or 0) / 10 for row in rows], dtype=float)
+        y = np.array([float(row.max_temperature) for row in rows], dtype=float)
+        rows = [rows[i] for i in lttb_indices(x, y, points)]
+
+    return {
+        'stack_id': stack_id,
+        'source_points': source_points,
+        'downsampled': source_points > points,
+        'series': [
+            {'act_date': row.act_date, 'shift': row.shift, 'max_temperature': float(row.max_temperature)}
+            for row in rows
+        ],
+    }
 
 @router.get("/{temperature_id}")
 async def get_temperature_by_id(temperature_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
@@ -40,7 +124,7 @@ async def get_temperature_by_id(temperature_id: int, db: Annotated[AsyncSession,
 
 @router.put("/update/{temperature_id}")
 async def update_temperature(temperature_id: int, db: Annotated[AsyncSession, Depends(get_db)], update_temperature: UpdateTemperature):
-    await db.execute(update(Temperature).where(Temperature.id == temperature_id).values(**{k: v for k, v in update_temperature.dict().items() if v is not None}))
+    await execute_or_conflict(db, update(Temperature).where(Temperature.id == temperature_id).values(**{k: v for k, v in update_temperature.dict().items() if v is not None}))
     await db.commit()
     return {
         'status_code': status.HTTP_200_OK,
@@ -56,14 +140,31 @@ async def delete_temperature(temperature_id: int, db: Annotated[AsyncSession, De
         'transaction': 'Successful'
     } 
 
-@router.post("/upload-csv")
-async def upload_csv(db: Annotated[AsyncSession, Depends(get_db)], file: UploadFile = File(...)):
-    try:
-        content = await file.read()
-        df = pd.read_csv(BytesIO(content))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка разбора CSV: {e}")
-    
+# Пакетные операции: одна операция — один SQL-оператор, весь пакет — одна транзакция
+
+@router.post("/batch/create")
+async def create_temperature_batch(db: Annotated[AsyncSession, Depends(get_db)], batch: CreateTemperatureBatch):
+    results = await batch_insert(db, Temperature.__table__, [item.model_dump() for item in batch.items], TEMPERATURE_KEY)
+    await db.commit()
+    return batch_report(results, status.HTTP_201_CREATED)
+
+@router.put("/batch/update")
+async def update_temperature_batch(db: Annotated[AsyncSession, Depends(get_db)], batch: UpdateTemperatureBatch):
+    results = await batch_update(db, Temperature.__table__, [item.model_dump(exclude_unset=True) for item in batch.items])
+    await db.commit()
+    return batch_report(results)
+
+@router.post("/batch/delete")
+async def delete_temperature_batch(db: Annotated[AsyncSession, Depends(get_db)], batch: DeleteTemperatureBatch):
+    results = await batch_delete(
+        db, Temperature.__table__, Temperature.act_date,
+        ids=batch.ids, stack_id=batch.stack_id, date_from=batch.date_from, date_to=batch.date_to,
+    )
+    await db.commit()
+    return batch_report(results)
+
+
+def prepare_temperature_frame(df: pd.DataFrame) -> pd.DataFrame:
     # 2) Переименовать колонки под удобные имена
     df = df.rename(columns={
         'Склад': 'warehouse_name',
@@ -81,59 +182,107 @@ async def upload_csv(db: Annotated[AsyncSession, Depends(get_db)], file: UploadF
     if missing_columns:
         raise HTTPException(status_code=400, detail=f"Отсутствуют обязательные колонки: {missing_columns}")
     
-    # 4) Преобразование столбца к datetime и затем к date
-    df['act_date'] = pd.to_datetime(df['act_date']).dt.date
-    df['max_temperature'] = df['max_temperature'].astype(float).apply(Decimal)
-
-    # 5) Заменить NaN на пустую строку во всех строковых столбцах
+    # 4) Заменить NaN на пустую строку во всех строковых столбцах
     df['picket'] = df['picket'].fillna('')
+    return df
 
-    # 6) Заменить NaN на None в числовых столбцах
-    df['shift'] = df['shift'].apply(lambda x: int(x) if pd.notnull(x) else None)
 
-    # 7) Для каждой строки находим brand_id и stack_id и создаём объект Temperature
-    temperatures_to_add = []
-    for row in df.itertuples(index=False):
-        q_brand = await db.execute(
-                select(Brand.id).where(Brand.name == str(row.brand_name))
-            )
-        brand_id = q_brand.scalar_one_or_none()
-        if brand_id is None:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Не найдена марка '{row.brand_name}'"
-            )
-        
-        # Найдём штабель по имени
-        stmt = (
-            select(Stack.id)
-            .join(Stack.warehouse)  # JOIN warehouse ON stack.warehouse_id = warehouse.id
-            .where(
-                Stack.name == str(row.stack_number),
-                Warehouse.name == str(row.warehouse_name)
-            )
+async def import_temperatures(
+    db: AsyncSession,
+    source: BinaryIO,
+    stream: bool = False,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    filename: Optional[str] = None,
+    force: bool = False,
+    dry_run: bool = False,
+    on_error: OnError = 'skip',
+    progress: Optional[Callable[[int], None]] = None,
+) -> dict:
+    # Тот же файл уже загружали — ничего не делаем, а если загрузили
+    # не целиком — догружаем только строки, не прошедшие тогда проверку
+    sha256 = await file_fingerprint(source)
+    duplicate, retry_rows = await find_pending_upload(db, 'temperature', sha256, force, dry_run)
+    if duplicate:
+        return duplicate
+
+    # В потоковом режиме файл (CSV, Parquet или Arrow IPC) читается кусками по
+    # chunk_size строк прямо из временного файла загрузки, и каждый кусок
+    # коммитится отдельно, поэтому память не растёт с размером файла
+    if stream:
+        reader = iter_upload_frames(source, filename, TEMPERATURE_DTYPES, chunk_size)
+    else:
+        reader = iter([await asyncio.to_thread(read_upload_frame, source, filename, TEMPERATURE_DTYPES)])
+
+    # 5) brand_id и stack_id ищем по словарям, загруженным один раз на весь файл
+    brand_ids = await load_brand_ids(db)
+    stack_ids = await load_stack_ids(db)
+
+    # Полная таблица ошибок нужна для dry_run и on_error=abort, иначе только первые
+    full_errors = dry_run or on_error == 'abort'
+    rows = inserted = updated = failed = chunks = 0
+    errors = []
+    # номера всех строк с ошибками: errors может быть усечён до MAX_REPORTED_ERRORS
+    failed_rows = set()
+    while True:
+        chunk = await asyncio.to_thread(next, reader, None)
+        if chunk is None:
+            break
+
+        chunk_rows = len(chunk)
+        chunk = prepare_temperature_frame(only_failed_rows(chunk, retry_rows))
+
+        # 6) Проверяем кусок целиком: дата, температура, смена, справочники, повторы
+        chunk, chunk_errors = validate_frame(
+            chunk, brand_ids, stack_ids, TEMPERATURE_KEY,
+            dates={'act_date': True},
+            numbers={'max_temperature': True},
+            integers={'shift': False},
         )
-        q_stack = await db.execute(stmt)
-        stack_id = q_stack.scalar_one_or_none()
-        if stack_id is None:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Не найден штабель '{row.stack_number, row.warehouse_name}'"
+
+        rows += chunk_rows
+        chunks += 1
+        failed += count_failed(chunk_errors)
+        failed_rows.update(e['row'] for e in chunk_errors)
+        errors += chunk_errors if full_errors else chunk_errors[:MAX_REPORTED_ERRORS - len(errors)]
+
+        # 7) Сохраняем кусок через COPY + upsert по естественному ключу; при
+        # on_error=abort после первой ошибки остальные куски только проверяются
+        if not dry_run and not (errors and on_error == 'abort'):
+            chunk_inserted, chunk_updated = await upsert_dataframe(
+                db, Temperature.__table__, chunk, TEMPERATURE_COLUMNS, TEMPERATURE_KEY
             )
-        
-        shift_value = int(row.shift) if pd.notna(row.shift) else None
-        temperature = Temperature(
-            brand_id=brand_id,
-            stack_id=stack_id,
-            max_temperature=row.max_temperature,
-            picket=row.picket,
-            act_date=row.act_date,
-            shift=shift_value
-        )
-        temperatures_to_add.append(temperature)
+            inserted += chunk_inserted
+            updated += chunk_updated
+            if stream and on_error == 'skip':
+                await db.commit()
+        if progress:
+            progress(chunk_rows)
 
-    # 8) Сохраняем все записи пачкой
-    db.add_all(temperatures_to_add)
+    if dry_run:
+        return {**validation_report(rows, rows - failed, errors), "chunks": chunks}
+    if errors and on_error == 'abort':
+        await db.rollback()
+        reject(errors)
+
+    await register_uploaded_file(db, 'temperature', sha256, filename, rows, failed_rows)
     await db.commit()
 
-    return {"status": "ok", "inserted": len(temperatures_to_add)}
+    return {**error_report(inserted, errors, failed, updated), "rows": rows, "chunks": chunks}
+
+
+@router.post("/upload-csv")
+async def upload_csv(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    file: UploadFile = File(...),
+    stream: bool = False,
+    chunk_size: int = Query(STREAM_CHUNK_SIZE, gt=0),
+    background: bool = False,
+    force: bool = False,
+    dry_run: bool = False,
+    on_error: OnError = 'skip',
+):
+    options = dict(chunk_size=chunk_size, filename=file.filename, force=force, dry_run=dry_run, on_error=on_error)
+    if background:
+        # В фоне всегда читаем кусками, чтобы не держать файл в памяти
+        return accepted(await submit_import('temperature', file, import_temperatures, stream=True, **options))
+    return await import_temperatures(db, file.file, stream=stream, **options)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy import insert, select, update, delete
 from typing import Annotated
@@ -7,6 +7,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.alchemy.db_depends import get_db
 from app.models.warehouse import Warehouse
 from app.schemas.warehouse import CreateWarehouse, UpdateWarehouse
+from app.infrastructure.cache import table_etag, etag_headers, not_modified, reference_cache
+from app.infrastructure.responses import table_response, response_format
+from app.infrastructure.lookup import parse_ids, id_in
+from app.infrastructure.jobs import submit_task, accepted
+from app.infrastructure.purge import purge_warehouse
 
 router = APIRouter(prefix="/warehouse", tags=["warehouse"])
 
@@ -14,16 +19,31 @@ router = APIRouter(prefix="/warehouse", tags=["warehouse"])
 async def create_warehouse(db: Annotated[AsyncSession, Depends(get_db)], create_warehouse: CreateWarehouse):
     await db.execute(insert(Warehouse).values(**create_warehouse.dict()))
     await db.commit()
+    # штабели в кэше ключуются названием склада
+    reference_cache.invalidate('warehouse', 'stack')
     return {
         'status_code': status.HTTP_201_CREATED,
         'transaction': 'Successful'
     }
 
 @router.get("/")
-async def get_all_warehouses(db: Annotated[AsyncSession, Depends(get_db)]):
-    result = await db.execute(select(Warehouse))
-    warehouses = result.scalars().all()
-    return warehouses
+async def get_all_warehouses(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
+    # Справочник меняется редко: если у клиента та же версия, отвечаем 304 без тела
+    etag = await table_etag(db, 'warehouse', variant=response_format(request))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    query = select(Warehouse.id, Warehouse.name)
+    result = await db.execute(query)
+    warehouses = [dict(row) for row in result.mappings()]
+    return table_response(request, warehouses, query.selected_columns, headers=etag_headers(etag))
+
+@router.get("/batch")
+async def get_warehouses_batch(request: Request, db: Annotated[AsyncSession, Depends(get_db)], ids: list[str] = Query(...)):
+    query = select(Warehouse.id, Warehouse.name).where(id_in(Warehouse.id, parse_ids(ids))).order_by(Warehouse.id)
+    result = await db.execute(query)
+    warehouses = [dict(row) for row in result.mappings()]
+    return table_response(request, warehouses, query.selected_columns)
 
 @router.get("/{warehouse_id}")
 async def get_warehouse_by_id(warehouse_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
@@ -35,16 +55,21 @@ async def get_warehouse_by_id(warehouse_id: int, db: Annotated[AsyncSession, Dep
 async def update_warehouse(warehouse_id: int, db: Annotated[AsyncSession, Depends(get_db)], update_warehouse: UpdateWarehouse):
     await db.execute(update(Warehouse).where(Warehouse.id == warehouse_id).values(**{k: v for k, v in update_warehouse.dict().items() if v is not None}))
     await db.commit()
+    reference_cache.invalidate('warehouse', 'stack')
     return {
         'status_code': status.HTTP_200_OK,
         'transaction': 'Successful'
     }
 
 @router.delete("/delete/{warehouse_id}")
-async def delete_warehouse(warehouse_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
-    await db.execute(delete(Warehouse).where(Warehouse.id == warehouse_id))
-    await db.commit()
+async def delete_warehouse(warehouse_id: int, db: Annotated[AsyncSession, Depends(get_db)], background: bool = False):
+    # Штабели и их данные удаляются пачками в отдельных транзакциях, а не одним каскадом;
+    # при выводе склада из эксплуатации background=true делает то же в фоне
+    if background:
+        return accepted(submit_task('warehouse_purge', purge_warehouse, warehouse_id=warehouse_id))
+    result = await purge_warehouse(db, warehouse_id)
     return {
         'status_code': status.HTTP_200_OK,
-        'transaction': 'Successful'
+        'transaction': 'Successful',
+        **result
     }
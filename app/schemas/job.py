@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional
+
+class ImportJob(BaseModel):
+    id: str
+    kind: str
+    filename: Optional[str] = None
+    status: str = 'queued'  # queued / running / done / failed
+    rows_processed: int = 0
+    errors: list[dict] = Field(default_factory=list)
+    result: Optional[dict] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    def advance(self, rows: int):
+        self.rows_processed += rows
+
+    @property
+    def throughput(self) -> Optional[float]:
+        # строк в секунду с момента старта
+        if self.started_at is None:
+            return None
+        elapsed = ((self.finished_at or datetime.now()) - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else None
+
+    def to_dict(self) -> dict:
+        return {**self.model_dump(), 'throughput': self.throughput}
@@ -1,24 +1,62 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date
-from typing import Optional
+from typing import Annotated, Optional
+from app.infrastructure.batch import MAX_BATCH_ITEMS
+
+# Вес помещается в DECIMAL(15, 4); NaN и бесконечности не принимаем
+Weight = Annotated[float, Field(allow_inf_nan=False, ge=-99_999_999_999.9999, le=99_999_999_999.9999)]
 
 class CreateSupplies(BaseModel):
     brand_id: int
     warehouse_id: int
     stack_number: int
     warehouse_date: date
-    warehouse_weight: float
+    warehouse_weight: Weight
     ship_date: Optional[date] = None
-    ship_weight: Optional[float] = None
+    ship_weight: Optional[Weight] = None
 
 class UpdateSupplies(BaseModel):
     brand_id: Optional[int] = None
     warehouse_id: Optional[int] = None
     stack_number: Optional[int] = None
     warehouse_date: Optional[date] = None
-    warehouse_weight: Optional[float] = None
+    warehouse_weight: Optional[Weight] = None
     ship_date: Optional[date] = None
-    ship_weight: Optional[float] = None
+    ship_weight: Optional[Weight] = None
 
 class DeleteSupplies(BaseModel):
-    id: int 
\ No newline at end of file
+    id: int
+
+
+# Пакетные операции: штабель задаётся id, как в таблице supplies
+
+class SuppliesItem(BaseModel):
+    brand_id: int
+    stack_id: int
+    warehouse_date: date
+    warehouse_weight: Weight
+    ship_date: Optional[date] = None
+    ship_weight: Optional[Weight] = None
+
+class SuppliesPatch(BaseModel):
+    # меняются только переданные поля; явный null очищает значение
+    id: int
+    brand_id: Optional[int] = None
+    stack_id: Optional[int] = None
+    warehouse_date: Optional[date] = None
+    warehouse_weight: Optional[Weight] = None
+    ship_date: Optional[date] = None
+    ship_weight: Optional[Weight] = None
+
+class CreateSuppliesBatch(BaseModel):
+    items: list[SuppliesItem] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class UpdateSuppliesBatch(BaseModel):
+    items: list[SuppliesPatch] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class DeleteSuppliesBatch(BaseModel):
+    # список id или фильтр по штабелю и дате выгрузки на склад (включительно)
+    ids: Optional[list[int]] = Field(None, max_length=MAX_BATCH_ITEMS)
+    stack_id: Optional[int] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
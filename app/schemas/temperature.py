@@ -1,12 +1,16 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date
-from typing import Optional
+from typing import Annotated, Optional
+from app.infrastructure.batch import MAX_BATCH_ITEMS
+
+# Температура помещается в DECIMAL(5, 2); NaN и бесконечности не принимаем
+TemperatureValue = Annotated[float, Field(allow_inf_nan=False, ge=-999.99, le=999.99)]
 
 class CreateTemperature(BaseModel):
     brand_id: int
     warehouse_id: int
     stack_number: int
-    max_temperature: float
+    max_temperature: TemperatureValue
     picket: str
     act_date: date
     shift: int
@@ -15,10 +19,44 @@ class UpdateTemperature(BaseModel):
     brand_id: Optional[int] = None
     warehouse_id: Optional[int] = None
     stack_number: Optional[int] = None
-    max_temperature: Optional[float] = None
+    max_temperature: Optional[TemperatureValue] = None
     picket: Optional[str] = None
     act_date: Optional[date] = None
     shift: Optional[int] = None
 
 class DeleteTemperature(BaseModel):
-    id: int 
\ No newline at end of file
+    id: int
+
+
+# Пакетные операции: штабель задаётся id, как в таблице temperature
+
+class TemperatureItem(BaseModel):
+    brand_id: Optional[int] = None
+    stack_id: int
+    max_temperature: TemperatureValue
+    picket: str
+    act_date: date
+    shift: Optional[int] = None
+
+class TemperaturePatch(BaseModel):
+    # меняются только переданные поля; явный null очищает значение
+    id: int
+    brand_id: Optional[int] = None
+    stack_id: Optional[int] = None
+    max_temperature: Optional[TemperatureValue] = None
+    picket: Optional[str] = None
+    act_date: Optional[date] = None
+    shift: Optional[int] = None
+
+class CreateTemperatureBatch(BaseModel):
+    items: list[TemperatureItem] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class UpdateTemperatureBatch(BaseModel):
+    items: list[TemperaturePatch] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class DeleteTemperatureBatch(BaseModel):
+    # список id или фильтр по штабелю и дате акта (включительно)
+    ids: Optional[list[int]] = Field(None, max_length=MAX_BATCH_ITEMS)
+    stack_id: Optional[int] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
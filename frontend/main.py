@@ -137,18 +137,15 @@ with col2:
 
 # Получаем предикты с сервера
 try:
-    resp = requests.get(f"{API_URL}/{year}/{month}")
+    resp = requests.get(f"{API_URL}/calendar/{year}/{month}")
     resp.raise_for_status()
-    predictions = resp.json()
+    calendar_days = resp.json()
 except Exception as e:
     st.error(f"Ошибка получения данных с сервера: {e}")
-    predictions = []
+    calendar_days = []
 
-fires_by_day = {}
-for pred in predictions:
-    day = int(pred['date'].split('-')[2])
-    fires_by_day.setdefault(day, 0)
-    fires_by_day[day] += 1
+# Количество возгораний по дням уже посчитано на сервере
+fires_by_day = {item['day']: item['count'] for item in calendar_days}
 
 # Отображение календаря
 calendar_html = render_calendar(year, month, fires_by_day)
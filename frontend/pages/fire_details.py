@@ -1,8 +1,7 @@
 import streamlit as st
 import pandas as pd
 import os
-import datetime
-import random
+import requests
 
 # Шапка сайта
 def header():
@@ -52,23 +51,35 @@ reasons = [
 ]
 st.write("\n".join(reasons))
 
-# --- График температуры (заглушка) ---
-st.subheader("📈 Динамика температуры (последние 10 дней)")
+# --- График температуры ---
+st.subheader("📈 Динамика температуры")
 
-def generate_temperature_data():
-    dates = pd.date_range(end=datetime.date.today(), periods=10)
-    temps = [random.uniform(35.0, 80.0) for _ in range(10)]
-    return pd.DataFrame({"Дата": dates, "Температура (°C)": temps})
+def fetch_temperature_data(stack_id):
+    # ряд максимальных температур по сменам; длинный ряд сервер прореживает сам
+    try:
+        resp = requests.get(f"http://localhost:8000/temperature/stack/{int(stack_id)}/series", params={"points": 300})
+        resp.raise_for_status()
+        series = resp.json()["series"]
+    except Exception as e:
+        st.warning(f"Ошибка получения данных с сервера: {e}")
+        series = []
+    df = pd.DataFrame(series, columns=["act_date", "max_temperature"])
+    df = df.groupby("act_date", as_index=False)["max_temperature"].max()
+    return df.rename(columns={"act_date": "Дата", "max_temperature": "Температура (°C)"})
 
-temp_data = generate_temperature_data()
-st.line_chart(temp_data.set_index("Дата"))
+temp_data = fetch_temperature_data(shabel_id)
+if temp_data.empty:
+    st.info("Нет замеров температуры")
+else:
+    st.line_chart(temp_data.set_index("Дата"))
 
-# --- Другие метрики (заглушка) ---
+# --- Другие метрики ---
 st.subheader("📊 Дополнительные показатели:")
 
 col1, col2, col3 = st.columns(3)
-col1.metric("Макс. температура", f"{max(temp_data['Температура (°C)']):.1f} °C")
-col2.metric("Средняя температура", f"{temp_data['Температура (°C)'].mean():.1f} °C")
+if not temp_data.empty:
+    col1.metric("Макс. температура", f"{temp_data['Температура (°C)'].max():.1f} °C")
+    col2.metric("Средняя температура", f"{temp_data['Температура (°C)'].mean():.1f} °C")
 col3.metric("Дней до возгорания", "≈ 5 дней")  # Здесь можно подставлять значение из ML модели
 
 # --- Подключение CSS стилей (если есть) ---
@@ -42,17 +42,27 @@ shabel_id = params.get("stack_id", [None])
 if shabel_id is not None:
     try:
         shabel_id_int = int(shabel_id)
-        resp = requests.get(f"{API_URL}/{shabel_id_int}")
-        print(resp.json())
-        if resp.status_code == 200 and resp.json():
+        # метаданные, вес, температуры и ближайшие прогнозы — одним запросом
+        resp = requests.get(f"{API_URL}/{shabel_id_int}/overview")
+        if resp.status_code == 200:
             stack = resp.json()
+            weight = stack.get('current_weight')
+            weight_text = f"{weight:.1f}" if weight is not None else "—"
             st.title(f"Штабель {stack.get('name', '')} (id {stack.get('id', '')})")
             st.markdown(f"""
             <div style="padding: 20px; background-color: #ffffff; border-radius: 12px; margin: 20px 0; box-shadow: 0 2px 8px rgba(0,0,0,0.05);">
                 <h3>Краткая информация:</h3>
                 <p><strong>Склад:</strong> {stack.get('warehouse_name')} (id {stack.get('warehouse_id')})</p>
+                <p><strong>Сформирован:</strong> {stack.get('formation_date') or '—'}</p>
+                <p><strong>Текущий вес, тн:</strong> {weight_text}</p>
             </div>
             """, unsafe_allow_html=True)
+            if stack['temperatures']:
+                st.subheader("Последние замеры температуры")
+                st.dataframe(pd.DataFrame(stack['temperatures']))
+            if stack['upcoming_predicts']:
+                st.subheader("Ближайшие прогнозы возгорания")
+                st.dataframe(pd.DataFrame(stack['upcoming_predicts']))
             # Можно добавить вывод других полей stack
         else:
             st.error("Штабель не найден.")
@@ -115,18 +125,15 @@ with col2:
 
 # Получаем предикты с сервера
 try:
-    resp = requests.get(f"http://localhost:8000/predict/stack/{shabel_id}/{year}/{month}")
+    resp = requests.get(f"http://localhost:8000/predict/calendar/{year}/{month}", params={"stack_id": shabel_id})
     resp.raise_for_status()
-    predictions = resp.json()
+    calendar_days = resp.json()
 except Exception as e:
     st.error(f"Ошибка получения данных с сервера: {e}")
-    predictions = []
+    calendar_days = []
 
-fires_by_day = {}
-for pred in predictions:
-    day = int(pred['date'].split('-')[2])
-    fires_by_day.setdefault(day, 0)
-    fires_by_day[day] += 1
+# Количество возгораний по дням уже посчитано на сервере
+fires_by_day = {item['day']: item['count'] for item in calendar_days}
 
 # Отображение календаря
 calendar_html = render_calendar(year, month, fires_by_day)
@@ -65,37 +65,55 @@ st.title("Выгрузки и отгрузки")
 
 # --- READ ALL ---
 st.header("Список выгрузок и отгрузок")
-resp = make_request("GET", f"{API_URL}/")
-shipments = []
+
+# Сервер отдаёт страницы по курсору; курсоры уже открытых страниц храним,
+# чтобы можно было вернуться назад без повторного прохода с начала
+if "shipments_cursors" not in st.session_state:
+    st.session_state.shipments_cursors = [None]
+
+page_size = st.selectbox("Строк на странице", [5, 20, 50, 100], index=0)
+if st.session_state.get("shipments_page_size") != page_size:
+    st.session_state.shipments_page_size = page_size
+    st.session_state.shipments_cursors = [None]
+
+cursors = st.session_state.shipments_cursors
+page = len(cursors)
+params = {"limit": page_size}
+if cursors[-1]:
+    params["cursor"] = cursors[-1]
+
+resp = make_request("GET", f"{API_URL}/", params=params)
+next_cursor = None
 
 if resp:
-    shipments = resp.json()
+    data = resp.json()
+    shipments = data["items"]
+    next_cursor = data["next_cursor"]
 else:
-    shipments = load_local_data()
+    # Локальные данные листаем по-старому, срезами
+    local_shipments = load_local_data()
+    start = (page - 1) * page_size
+    shipments = local_shipments[start:start + page_size]
+    if start + page_size < len(local_shipments):
+        next_cursor = str(page)
 
 if not shipments:
     st.info("Список выгрузок и отгрузок пуст")
 else:
-    # --- Пагинация ---
-    page_size = 5
-    total = len(shipments)
-    total_pages = (total + page_size - 1) // page_size
-
-    page = st.number_input(
-        "Страница",
-        min_value=1,
-        max_value=max(1, total_pages),
-        value=1,
-        step=1
-    )
-
-    start = (page - 1) * page_size
-    end = start + page_size
-    
     # Создаем таблицу для отображения выгрузок и отгрузок
-    st.table(pd.DataFrame(shipments[start:end]))
-    
-    st.caption(f"Страница {page} из {total_pages}")
+    st.table(pd.DataFrame(shipments))
+
+    col_prev, col_next = st.columns(2)
+    with col_prev:
+        if page > 1 and st.button("Назад"):
+            cursors.pop()
+            st.rerun()
+    with col_next:
+        if next_cursor and st.button("Дальше"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+    st.caption(f"Страница {page}")
 
 # --- CREATE ---
 st.header("Создать новую выгрузку/отгрузку")
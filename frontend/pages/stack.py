@@ -52,14 +52,29 @@ header()
 #     return pd.DataFrame(shabel_data)
 
 
-def fetch_stacks():
+PAGE_SIZE = 100
+
+
+def fetch_stacks(search_query="", id_filter="", warehouse_filter="", cursor=None):
+    # Фильтрует и режет на страницы сервер, сюда приходят только подходящие штабели
+    params = {"limit": PAGE_SIZE}
+    if search_query:
+        params["q"] = search_query
+    if id_filter.strip().isdigit():
+        params["id"] = int(id_filter)
+    if warehouse_filter.strip().isdigit():
+        params["warehouse_id"] = int(warehouse_filter)
+    if cursor:
+        params["cursor"] = cursor
+    # колоночный JSON: {"columns": {имя: [значения]}} сразу собирается в DataFrame
+    params["format"] = "columns"
     try:
-        resp = requests.get(f"{API_URL}/")
+        resp = requests.get(f"{API_URL}/", params=params)
         resp.raise_for_status()
         return resp.json()
     except Exception as e:
         st.warning(f"Ошибка получения данных с сервера: {e}")
-        return []
+        return {"columns": {}, "next_cursor": None}
 
 # Заголовок + форма добавления
 st.markdown("""
@@ -123,23 +138,18 @@ with col1:
 with col3:
     warehouse_filter = st.text_input("Фильтр по складу", placeholder="Введите номер склада")
 
-# Применяем фильтры
-stacks_data = fetch_stacks()
-if not stacks_data:
+# Применяем фильтры: при их смене начинаем снова с первой страницы
+filters = (search_query, id_filter, warehouse_filter)
+if st.session_state.get("stack_filters") != filters:
+    st.session_state.stack_filters = filters
+    st.session_state.stack_cursors = [None]
+cursors = st.session_state.stack_cursors
+
+stacks_page = fetch_stacks(search_query, id_filter, warehouse_filter, cursors[-1])
+filtered_df = pd.DataFrame(stacks_page["columns"], columns=["id", "name", "warehouse_id", "warehouse_name"])
+if filtered_df.empty and not any(filters) and len(cursors) == 1:
     st.info("Нет данных о штабелях")
     st.stop()
-df_stacks = pd.DataFrame(stacks_data)
-
-filtered_df = df_stacks.copy()
-
-if search_query:
-    filtered_df = filtered_df[filtered_df['name'].str.contains(search_query, case=False, na=False)]
-
-if id_filter:
-    filtered_df = filtered_df[filtered_df['id'].astype(str).str.contains(id_filter)]
-
-if warehouse_filter:
-    filtered_df = filtered_df[filtered_df['warehouse_id'].astype(str).str.contains(warehouse_filter)]
 
 # Отображаем отфильтрованный список штабелей
 st.markdown("""
@@ -150,6 +160,17 @@ st.markdown("""
 
 st.dataframe(filtered_df)
 
+col_prev, col_next = st.columns(2)
+with col_prev:
+    if len(cursors) > 1 and st.button("Назад"):
+        cursors.pop()
+        st.rerun()
+with col_next:
+    if stacks_page["next_cursor"] and st.button("Дальше"):
+        cursors.append(stacks_page["next_cursor"])
+        st.rerun()
+st.caption(f"Страница {len(cursors)}")
+
 # Кнопка для скачивания таблицы в формате CSV
 csv = filtered_df.to_csv(index=False)  # Преобразуем таблицу в CSV
 st.download_button(
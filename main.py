@@ -6,8 +6,11 @@ from fastapi import Request, HTTPException
 from fastapi import FastAPI
 from fastapi import status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.exceptions import RequestValidationError
+from fastapi.encoders import jsonable_encoder
 from starlette.middleware.sessions import SessionMiddleware
 from typing import Annotated
+import math
 
 from app.routers import brand
 from app.routers import supplies
@@ -17,9 +20,24 @@ from app.routers import location
 from app.routers import stack
 from app.routers import predict
 from app.routers import current_predict
+from app.routers import jobs
+from app.routers import imports
+from app.routers import export
+from app.routers import features
 
 app = FastAPI()
 
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    # json.loads пропускает NaN / Infinity; схемы их отклоняют, но в 422 значение
+    # возвращается в input, а стандартный JSON-ответ такие числа не сериализует
+    errors = [
+        {**error, 'input': None} if isinstance(error.get('input'), float) and not math.isfinite(error['input']) else error
+        for error in exc.errors()
+    ]
+    return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content={'detail': jsonable_encoder(errors)})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -39,4 +57,8 @@ app.include_router(temperature.router)
 app.include_router(location.router)
 app.include_router(stack.router)
 app.include_router(predict.router)
-app.include_router(current_predict.router)
\ No newline at end of file
+app.include_router(current_predict.router)
+app.include_router(jobs.router)
+app.include_router(imports.router)
+app.include_router(export.router)
+app.include_router(features.router)
\ No newline at end of file